@@ -1,14 +1,44 @@
 """Gather and process information from EuroPMC."""
 
+import logging
 import math
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
+from io import BytesIO
 from typing import Literal, Tuple
 from urllib.parse import quote
-from xml.etree.ElementTree import Element
+
+from lxml import etree as ET
+from lxml.etree import _Element as Element
 
 from citations.data_sources.utils import parse_xml
 from citations.schemas import Article, ArticleCitesArticle
-from citations.utils import get_with_waiting, normalize_title, to_date
+from citations.utils import get_with_waiting, normalize_title, to_date, xpath_text
+
+logger = logging.getLogger(__name__)
+
+# XPath expressions are compiled once and evaluated by libxml2. Plain strings are returned
+# (smart_strings=False) so that extracted values do not keep the whole response tree alive.
+RESULTS_XPATH = ET.XPath("./resultList/result")
+ID_XPATH = ET.XPath("./id/text()", smart_strings=False)
+SOURCE_XPATH = ET.XPath("./source/text()", smart_strings=False)
+DOI_XPATH = ET.XPath("./doi/text()", smart_strings=False)
+TITLE_XPATH = ET.XPath("./title/text()", smart_strings=False)
+ABSTRACT_XPATH = ET.XPath("./abstractText/text()", smart_strings=False)
+URL_XPATH = ET.XPath("./fullTextUrlList/fullTextUrl/url/text()", smart_strings=False)
+PMID_XPATH = ET.XPath("./pmid/text()", smart_strings=False)
+PUBLICATION_DATE_XPATH = ET.XPath("./firstPublicationDate/text()", smart_strings=False)
+CITED_BY_COUNT_XPATH = ET.XPath("./citedByCount/text()", smart_strings=False)
+ORCID_IDS_XPATH = ET.XPath("./authorIdList/authorId[@type='ORCID']/text()", smart_strings=False)
+
+# Articles already fetched, by EuroPMC id. Only the Article is kept, not the response tree, and
+# failed fetches are not stored so that they are retried. Guarded by a lock because articles are
+# fetched from a thread pool.
+ARTICLE_CACHE_SIZE = 256
+ARTICLE_CACHE: OrderedDict[str, Article] = OrderedDict()
+ARTICLE_CACHE_LOCK = threading.Lock()
 
 
 def get_citations(
@@ -27,16 +57,24 @@ def get_citations(
         "NBK",
     ],
     europmc_xml_map: dict | None = None,
+    max_workers: int = 8,
 ) -> tuple[list[ArticleCitesArticle], list[Article]] | None:
     """
     Retrieve and process citations for a given article.
 
+    The citing articles are fetched by a thread pool so that the requests overlap; they
+    share the pooled connections of the HTTP client.
+
     Parameters
     ----------
     europmc_id : str
         The Europe PMC ID of the article to fetch citations for.
     europmc_source : str
         The source of the Euro PMC article.
+    europmc_xml_map : dict | None
+        If given, the fetched XML of each citing article is stored in it.
+    max_workers : int
+        The number of articles fetched at the same time.
 
     Returns
     -------
@@ -50,8 +88,14 @@ def get_citations(
 
     citing_articles = []
     citations = []
-    for citation_europmc_id in citation_europmc_ids:
-        article = get_article(citation_europmc_id, europmc_xml_map)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        articles = list(
+            executor.map(
+                lambda citation_europmc_id: get_article(citation_europmc_id, europmc_xml_map),
+                citation_europmc_ids,
+            )
+        )
+    for citation_europmc_id, article in zip(citation_europmc_ids, articles):
         if article is None:
             continue
         citing_articles.append(article)
@@ -72,59 +116,79 @@ def get_article(europmc_id: str, europmc_xml_map: dict | None = None) -> Article
     ----------
     europmc_id : str
         id for an EuroPMC article
+    europmc_xml_map : dict | None
+        If given, the fetched XML of the article is stored in it.
 
     Returns
     -------
     Article
     """
+    with ARTICLE_CACHE_LOCK:
+        article = ARTICLE_CACHE.get(europmc_id)
+        if article is not None:
+            ARTICLE_CACHE.move_to_end(europmc_id)
+    # A cached article still has to be fetched again if its XML is missing from the map
+    if article is not None and (europmc_xml_map is None or europmc_id in europmc_xml_map):
+        return article
+
+    fetched = fetch_article(europmc_id)
+    if fetched is None:
+        return None
+
+    root, article = fetched
+    with ARTICLE_CACHE_LOCK:
+        ARTICLE_CACHE[europmc_id] = article
+        ARTICLE_CACHE.move_to_end(europmc_id)
+        if len(ARTICLE_CACHE) > ARTICLE_CACHE_SIZE:
+            ARTICLE_CACHE.popitem(last=False)
+    if europmc_xml_map is not None:
+        europmc_xml_map[europmc_id] = root
+    return article
+
+
+def fetch_article(europmc_id: str) -> tuple[Element, Article] | None:
+    r"""Fetch the XML and metadata of an article from Euro PMC.
+
+    \f
+    Parameters
+    ----------
+    europmc_id : str
+        id for an EuroPMC article
+
+    Returns
+    -------
+    tuple[Element, Article] | None
+        The root of the XML response and the article, or None if the response is not valid XML.
+
+    Raises
+    ------
+    ValueError
+        If Euro PMC has no article with this id.
+    """
     response = get_with_waiting(
         "https://www.ebi.ac.uk/europepmc/webservices" f"/rest/search?query=EXT_ID:{europmc_id}&resultType=core"
     )
-    root = parse_xml(response.text)
+    root = parse_xml(response.content)
     if root is None:
         return None
 
-    if europmc_xml_map:
-        europmc_xml_map[europmc_id] = root
-    result = root.find("./resultList/result")
-    if result is None:
+    results = RESULTS_XPATH(root)
+    if not results:
         raise ValueError(f"Invalid europmc id: {europmc_id}")
-
-    element = result.find("./doi")
-    if element is not None:
-        doi = element.text
-    else:
-        doi = None
-    element = result.find("./title")
-    if element is not None:
-        title = element.text  # type: ignore
-    element = result.find("./abstractText")
-    if element is not None:
-        abstract = element.text
-    else:
-        abstract = None
-    element = result.find("./fullTextUrlList/fullTextUrl/url")
-    if element is not None:
-        url = element.text
-    else:
-        url = None
-    element = result.find("./pmid")
-    if element is not None and element.text is not None:
-        pmid = str(int(element.text))
-    else:
-        pmid = None
-    element = result.find("./firstPublicationDate")
-    if element is not None and element.text is not None:
-        publication_date = to_date(element.text)
-    else:
-        publication_date = None
-    element = result.find("./citedByCount")
-    if element is not None and element.text is not None:
-        citations = int(element.text)
-    else:
-        citations = None
-
-    return Article(
+    result = results[0]
+
+    doi = xpath_text(DOI_XPATH, result)
+    title = xpath_text(TITLE_XPATH, result)
+    abstract = xpath_text(ABSTRACT_XPATH, result)
+    url = xpath_text(URL_XPATH, result)
+    text = xpath_text(PMID_XPATH, result)
+    pmid = str(int(text)) if text is not None else None
+    text = xpath_text(PUBLICATION_DATE_XPATH, result)
+    publication_date = to_date(text) if text is not None else None
+    text = xpath_text(CITED_BY_COUNT_XPATH, result)
+    citations = int(text) if text is not None else None
+
+    return root, Article(
         uid=europmc_id,
         title=title,  # type: ignore
         publication_date=publication_date,  # type: ignore
@@ -174,36 +238,22 @@ def extract_bbp_article(
     Tuple[Article, str, str]
         A tuple containing the Article object, the source of the article from Europe PMC, and the Europe PMC ID.
     """
-    pmid_elem = element.find("./pmid")
-    if pmid_elem is not None and pmid_elem.text is not None:
-        pmid = str(int(pmid_elem.text))
-    else:
-        pmid = None
-    europmc_id_elem = element.find("./id")
-    europmc_id = europmc_id_elem.text  # type: ignore
+    text = xpath_text(PMID_XPATH, element)
+    pmid = str(int(text)) if text is not None else None
+    europmc_id = xpath_text(ID_XPATH, element)
     if publication_date is None:
-        publication_date_elem = element.find("./firstPublicationDate")
-        if publication_date_elem is not None and publication_date_elem.text is not None:
-            publication_date = to_date(publication_date_elem.text)
-    europmc_source_elem = element.find("./source")  # type: ignore
-    europmc_source = europmc_source_elem.text  # type: ignore
+        text = xpath_text(PUBLICATION_DATE_XPATH, element)
+        if text is not None:
+            publication_date = to_date(text)
+    europmc_source = xpath_text(SOURCE_XPATH, element)
     if abstract is None:
-        europmc_abstract = element.find("./abstractText")
-        if europmc_abstract is not None:
-            abstract = europmc_abstract.text
+        abstract = xpath_text(ABSTRACT_XPATH, element)
     if doi is None:
-        europmc_doi = element.find("./doi")
-        if europmc_doi is not None:
-            doi = europmc_doi.text
+        doi = xpath_text(DOI_XPATH, element)
     if url is None:
-        europmc_url = element.find("./fullTextUrlList/fullTextUrl/url")
-        if europmc_url is not None:
-            url = europmc_url.text
-    citations = element.find("./citedByCount")
-    if citations is not None and citations.text is not None:
-        citations_num = int(citations.text)
-    else:
-        citations_num = None
+        url = xpath_text(URL_XPATH, element)
+    text = xpath_text(CITED_BY_COUNT_XPATH, element)
+    citations_num = int(text) if text is not None else None
 
     article = Article(
         uid=europmc_id,  # type: ignore
@@ -238,8 +288,7 @@ def extract_authors(element: Element) -> list[str]:
         A list of citation IDs associated with the given article.
     """
     # Maybe later we might want to add other author id types.
-    elements = element.findall("./authorIdList/authorId[@type='ORCID']")
-    return [orcid_id.text for orcid_id in elements if orcid_id is not None and orcid_id.text is not None]
+    return ORCID_IDS_XPATH(element)
 
 
 def fetch_citation_ids(europmc_id: str, europmc_source: str, page_size: int = 1000) -> list[str] | None:
@@ -264,26 +313,63 @@ def fetch_citation_ids(europmc_id: str, europmc_source: str, page_size: int = 10
         f"https://www.ebi.ac.uk/europepmc/webservices/rest/{europmc_source}/{europmc_id}"
         f"/citations?page=1&pageSize={page_size}&format=xml"
     )
-    root = parse_xml(response.text)
-    if root is None:
+    parsed_page = parse_citation_page(response.content)
+    if parsed_page is None:
         return None
 
-    num_citations = int(root.find(".//hitCount").text)  # type: ignore
+    num_citations, citation_ids = parsed_page
     if num_citations == 0:
         return []
     pages = math.ceil(num_citations / page_size)
-    citation_ids = [result.text for result in root.findall("./citationList/citation/id")]
     for page in range(2, pages + 1):
         response = get_with_waiting(
             f"https://www.ebi.ac.uk/europepmc/webservices/rest/{europmc_source}/{europmc_id}"
             f"/citations?page={page}&pageSize={page_size}&format=xml"
         )
-        root = parse_xml(response.text)
-        if root is None:
+        parsed_page = parse_citation_page(response.content)
+        if parsed_page is None:
             continue
-        citation_ids.extend([result.text for result in root.findall("./citationList/citation/id")])
+        citation_ids.extend(parsed_page[1])
     citation_ids = [citation_id for citation_id in citation_ids if citation_id != europmc_id]
-    return citation_ids  # type: ignore
+    return citation_ids
+
+
+def parse_citation_page(content: bytes) -> tuple[int, list[str]] | None:
+    r"""Stream a page of citations returned by Europe PMC.
+
+    Citations are dropped from the tree as soon as their id is read, so memory use does not
+    grow with the page size.
+
+    \f
+    Parameters
+    ----------
+    content : bytes
+        The raw XML response body.
+
+    Returns
+    -------
+    tuple[int, list[str]] | None
+        The total number of citations and the citation IDs on this page, or None if the
+        response is not valid XML.
+    """
+    num_citations = 0
+    citation_ids = []
+    try:
+        for _, element in ET.iterparse(BytesIO(content), tag=("hitCount", "citation"), resolve_entities=False):
+            if element.tag == "hitCount":
+                num_citations = int(element.text)
+                continue
+            citation_id = element.findtext("id")
+            if citation_id is not None:
+                citation_ids.append(citation_id)
+            element.clear()
+            # Also remove the citations already read, which the parser keeps attached to the tree
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+    except ET.XMLSyntaxError:
+        logger.error(f"Error parsing XML ({len(content)} bytes): {content[:500]!r}")
+        return None
+    return num_citations, citation_ids
 
 
 def fetch_article_element(doi: str, isbns: str | None, title: str) -> Element | None:
@@ -309,12 +395,13 @@ def fetch_article_element(doi: str, isbns: str | None, title: str) -> Element |
         response = get_with_waiting(
             "https://www.ebi.ac.uk/europepmc/webservices/rest/" f"search?query=DOI:{doi}&resultType=core"
         )
-        root = parse_xml(response.text)
+        root = parse_xml(response.content)
         if root is not None:
-            article_element = root.find("./resultList/result")
+            results = RESULTS_XPATH(root)
 
-            if article_element is not None:
-                result_title = article_element.find("./title").text  # type: ignore
+            if results:
+                article_element = results[0]
+                result_title = xpath_text(TITLE_XPATH, article_element)
                 if normalize_title(result_title) == normalized_title:  # type: ignore
                     return article_element
 
@@ -323,12 +410,13 @@ def fetch_article_element(doi: str, isbns: str | None, title: str) -> Element |
             response = get_with_waiting(
                 "https://www.ebi.ac.uk/europepmc/webservices/rest/" f"search?query=ISBN:{isbn}&resultType=core"
             )
-            root = parse_xml(response.text)
+            root = parse_xml(response.content)
             if root is not None:
-                article_element = root.find("./resultList/result")
-                if article_element is not None:
-                    result_title = article_element.find("./title").text  # type: ignore
-                    if normalize_title(str(result_title)) == normalized_title:  # type: ignore
+                results = RESULTS_XPATH(root)
+                if results:
+                    article_element = results[0]
+                    result_title = xpath_text(TITLE_XPATH, article_element)
+                    if normalize_title(str(result_title)) == normalized_title:
                         return article_element
 
     # When using a title in a query we need to replace spaces
@@ -336,12 +424,17 @@ def fetch_article_element(doi: str, isbns: str | None, title: str) -> Element |
     response = get_with_waiting(
         "https://www.ebi.ac.uk/europepmc/webservices" f"/rest/search?query={query_title}&resultType=core"
     )
-    root = parse_xml(response.text)
+    root = parse_xml(response.content)
     if root is None:
         return None
-    results = root.findall("./resultList/result")
-    for element in results:
-        result_title = element.find("./title").text  # type: ignore
+    for element in RESULTS_XPATH(root):
+        result_title = xpath_text(TITLE_XPATH, element)
         if normalize_title(result_title) == normalized_title:  # type: ignore
             return element
     return None
+
+
+def clear_caches() -> None:
+    """Clear the cache of the articles fetched from Euro PMC."""
+    with ARTICLE_CACHE_LOCK:
+        ARTICLE_CACHE.clear()
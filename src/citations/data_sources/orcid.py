@@ -2,14 +2,15 @@
 
 import calendar
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
 from typing import Literal, cast
 from urllib.parse import quote
-from xml.etree import ElementTree as ET
-from xml.etree.ElementTree import Element
 
 import httpx
 from httpx import HTTPStatusError
+from lxml import etree as ET
+from lxml.etree import _Element as Element
 
 import citations.data_sources.utils
 from citations.schemas import (
@@ -19,7 +20,7 @@ from citations.schemas import (
     Institution,
     OrganizationIdSource,
 )
-from citations.utils import generate_unique_id, get_with_waiting, normalize_title
+from citations.utils import generate_unique_id, get_with_waiting, normalize_title, xpath_text
 
 logger = logging.getLogger(__name__)
 
@@ -58,6 +59,41 @@ AFFILIATION_TYPES = [
     "work",
 ]
 
+# XPath expressions are compiled once and evaluated by libxml2. Plain strings are returned
+# (smart_strings=False) so that extracted values do not keep the whole record tree alive.
+ORCID_PATHS_XPATH = ET.XPath("./search:result/common:orcid-identifier/common:path", namespaces=NAMESPACES)
+ORCID_PATH_TEXTS_XPATH = ET.XPath(
+    "./search:result/common:orcid-identifier/common:path/text()", namespaces=NAMESPACES, smart_strings=False
+)
+WORK_TITLES_XPATH = ET.XPath(
+    "./activities:activities-summary/activities:*/activities:group/*/*/common:title/text()",
+    namespaces=NAMESPACES,
+    smart_strings=False,
+)
+AFFILIATION_DATE_XPATHS = {
+    (date_type, part): ET.XPath(
+        f"./common:{date_type}/common:{part}/text()", namespaces=NAMESPACES, smart_strings=False
+    )
+    for date_type in ("start-date", "end-date")
+    for part in ("year", "month", "day")
+}
+PERSON_NAME_XPATH = ET.XPath(".//person:name", namespaces=NAMESPACES)
+GIVEN_NAMES_XPATH = ET.XPath(".//personal-details:given-names/text()", namespaces=NAMESPACES, smart_strings=False)
+FAMILY_NAME_XPATH = ET.XPath(".//personal-details:family-name/text()", namespaces=NAMESPACES, smart_strings=False)
+# One expression per affiliation type, so that positions stay grouped in AFFILIATION_TYPES order
+AFFILIATION_XPATHS = [
+    ET.XPath(f".//{affiliation}:{affiliation}-summary", namespaces=NAMESPACES) for affiliation in AFFILIATION_TYPES
+]
+ORGANIZATION_NAME_XPATH = ET.XPath(
+    ".//common:organization/common:name/text()", namespaces=NAMESPACES, smart_strings=False
+)
+ORGANIZATION_ID_XPATH = ET.XPath(
+    ".//common:disambiguated-organization-identifier/text()", namespaces=NAMESPACES, smart_strings=False
+)
+ORGANIZATION_SOURCE_XPATH = ET.XPath(
+    ".//common:disambiguation-source/text()", namespaces=NAMESPACES, smart_strings=False
+)
+
 
 def extract_affiliation_date(position: Element, date_type: Literal["start-date", "end-date"]) -> date | None:
     """
@@ -75,21 +111,9 @@ def extract_affiliation_date(position: Element, date_type: Literal["start-date",
     date | None
         The extracted date, or None if the date is not available or incomplete.
     """
-    element = position.find(
-        f"./common:{date_type}/common:year",
-        namespaces=NAMESPACES,
-    )
-    year_str = None if element is None else element.text
-    element = position.find(
-        f"./common:{date_type}/common:month",
-        namespaces=NAMESPACES,
-    )
-    month_str = None if element is None else element.text
-    element = position.find(
-        f"./common:{date_type}/common:day",
-        namespaces=NAMESPACES,
-    )
-    day_str = None if element is None else element.text
+    year_str = xpath_text(AFFILIATION_DATE_XPATHS[date_type, "year"], position)
+    month_str = xpath_text(AFFILIATION_DATE_XPATHS[date_type, "month"], position)
+    day_str = xpath_text(AFFILIATION_DATE_XPATHS[date_type, "day"], position)
     if year_str is not None:
         year = int(year_str)
         if month_str is not None and day_str is not None:
@@ -172,14 +196,11 @@ def get_orcidids_from_author_names(author_names: list[str], max_author_names: in
             return []
 
         if response.status_code == 200:
-            root = citations.data_sources.utils.parse_xml(response.text)
+            root = citations.data_sources.utils.parse_xml(response.content)
             if root is None:
                 continue
 
-            elements = root.findall(
-                "./search:result/common:orcid-identifier/common:path",
-                namespaces=NAMESPACES,
-            )[:max_author_names]
+            elements = ORCID_PATHS_XPATH(root)[:max_author_names]
             if len(elements) == 0:
                 continue
             if len(elements) == 1:
@@ -195,7 +216,7 @@ def get_orcidids_from_author_names(author_names: list[str], max_author_names: in
                     endpoint = f"https://pub.orcid.org/v3.0/{orcid_id_element.text}/record"
                     response = get_with_waiting(endpoint)
 
-                    record = citations.data_sources.utils.parse_xml(response.text)
+                    record = citations.data_sources.utils.parse_xml(response.content)
                     if record is None:
                         continue
                     name = get_author_name(record)
@@ -208,7 +229,7 @@ def get_orcidids_from_author_names(author_names: list[str], max_author_names: in
                     if elements[0].text is not None:
                         orcid_ids.append(elements[0].text)
                     try:
-                        record = ET.fromstring(response.text)
+                        record = ET.fromstring(response.content, parser=citations.data_sources.utils.get_xml_parser())
                     except ET.ParseError as e:
                         logger.error(f"Error parsing result of call to {endpoint}")
                         logger.error(f"Response text: {response.text}")
@@ -265,20 +286,41 @@ def get_orcidids_from_endpoint(endpoint: str) -> list[str]:
         return []
 
     try:
-        root = ET.fromstring(response.text)
+        root = ET.fromstring(response.content, parser=citations.data_sources.utils.get_xml_parser())
     except ET.ParseError:
         logger.error(f"Error parsing result of call to {endpoint}")
         logger.error(f"Response text: {response.text}")
         return []
 
-    elements = root.findall(
-        "./search:result/common:orcid-identifier/common:path",
-        namespaces=NAMESPACES,
-    )
-    return [path.text for path in elements if path.text is not None]
+    return ORCID_PATH_TEXTS_XPATH(root)
 
 
-def filter_orcidids(orcid_ids: list[str], article_title: str) -> list[str]:
+def is_article_author(orcidid: str, normalized_article_title: str) -> bool:
+    """
+    Check whether an article title is among the works of an Orcid author.
+
+    Parameters
+    ----------
+    orcidid : str
+        Orcid id of the author.
+    normalized_article_title : str
+        Normalized title of the article.
+
+    Returns
+    -------
+    bool
+        True if the article is listed in the author's Orcid record.
+    """
+    response = get_with_waiting(f"https://pub.orcid.org/v3.0/{orcidid}/record")
+
+    root = citations.data_sources.utils.parse_xml(response.content)
+    if root is None:
+        return False
+
+    return any(normalize_title(title) == normalized_article_title for title in WORK_TITLES_XPATH(root))
+
+
+def filter_orcidids(orcid_ids: list[str], article_title: str, max_workers: int = 8) -> list[str]:
     """
     Filter orcidids to the authors that are actually authors of the article.
 
@@ -288,6 +330,8 @@ def filter_orcidids(orcid_ids: list[str], article_title: str) -> list[str]:
         List of ids to filter
     article_title : str
         Title of the article.
+    max_workers : int
+        The number of Orcid records fetched at the same time.
 
     Returns
     -------
@@ -295,22 +339,14 @@ def filter_orcidids(orcid_ids: list[str], article_title: str) -> list[str]:
         List of authors for this article if they can be found in Orcid.
     """
     normalized_article_title = normalize_title(article_title)
-    actual_author_orcidids = []
-    for orcidid in orcid_ids:
-        response = get_with_waiting(f"https://pub.orcid.org/v3.0/{orcidid}/record")
-
-        root = citations.data_sources.utils.parse_xml(response.text)
-        if root is None:
-            continue
-
-        elements = root.findall(
-            "./activities:activities-summary/activities:*/activities:group/*/*/common:title",
-            namespaces=NAMESPACES,
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        is_author = list(
+            executor.map(
+                lambda orcidid: is_article_author(orcidid, normalized_article_title),
+                orcid_ids,
+            )
         )
-        normalized_titles = {normalize_title(element.text) for element in elements if element.text is not None}
-        if normalized_article_title in normalized_titles:
-            actual_author_orcidids.append(orcidid)
-    return actual_author_orcidids
+    return [orcidid for orcidid, matches in zip(orcid_ids, is_author) if matches]
 
 
 def get_author_orcid_information(
@@ -346,7 +382,7 @@ def get_author_orcid_information(
     endpoint = f"https://pub.orcid.org/v3.0/{orcidid}/record"
     response = get_with_waiting(endpoint)
 
-    record = citations.data_sources.utils.parse_xml(response.text)
+    record = citations.data_sources.utils.parse_xml(response.content)
     if record is None:
         return None
 
@@ -378,14 +414,12 @@ def get_author_name(record: Element) -> str | None:
     str | None
         Name of the author if available.
     """
-    element = record.find(".//person:name", namespaces=NAMESPACES)
-    if element is not None:
-        given_names_element = element.find(".//personal-details:given-names", namespaces=NAMESPACES)
-        family_name_element = element.find(".//personal-details:family-name", namespaces=NAMESPACES)
-        if given_names_element is not None and family_name_element is not None:
-            if given_names_element.text is not None and family_name_element.text is not None:
-                name = given_names_element.text + " " + family_name_element.text
-                return name
+    elements = PERSON_NAME_XPATH(record)
+    if elements:
+        given_names = xpath_text(GIVEN_NAMES_XPATH, elements[0])
+        family_name = xpath_text(FAMILY_NAME_XPATH, elements[0])
+        if given_names is not None and family_name is not None:
+            return given_names + " " + family_name
     return None
 
 
@@ -404,44 +438,27 @@ def get_author_affiliations(
         The XML element containing the ORCID record data.
     """
     positions = []
-    for affiliation in AFFILIATION_TYPES:
-        positions.extend(
-            record.findall(
-                f".//{affiliation}:{affiliation}-summary",
-                namespaces=NAMESPACES,
-            )
-        )
+    for affiliation_xpath in AFFILIATION_XPATHS:
+        positions.extend(affiliation_xpath(record))
 
     institutions = []
     affiliations = []
     for position in positions:
-        element = position.find(
-            ".//common:organization/common:name",
-            namespaces=NAMESPACES,
-        )
-        if element is None or element.text is None:
+        organization = xpath_text(ORGANIZATION_NAME_XPATH, position)
+        if organization is None:
             continue
-        organization = element.text
 
         start_date = extract_affiliation_date(position, "start-date")
         end_date = extract_affiliation_date(position, "end-date")
 
-        element = position.find(
-            ".//common:disambiguated-organization-identifier",
-            namespaces=NAMESPACES,
-        )
-        if element is not None and element.text is not None:
-            org_id = element.text
-        else:
+        org_id = xpath_text(ORGANIZATION_ID_XPATH, position)
+        if org_id is None:
             # If missing, what should be the placeholder id ?
             org_id = generate_unique_id(organization)
 
-        element = position.find(
-            ".//common:disambiguation-source",
-            namespaces=NAMESPACES,
-        )
-        if element is not None and element.text is not None:
-            org_source = cast(OrganizationIdSource, element.text)
+        text = xpath_text(ORGANIZATION_SOURCE_XPATH, position)
+        if text is not None:
+            org_source = cast(OrganizationIdSource, text)
         else:
             org_source = "sha256"
 
@@ -486,15 +503,11 @@ def get_article_from_endpoint(endpoint: str) -> str | None:
         return None
 
     try:
-        root = ET.fromstring(response.text)
+        root = ET.fromstring(response.content, parser=citations.data_sources.utils.get_xml_parser())
     except ET.ParseError:
         return None
 
-    elements = root.findall(
-        "./search:result/common:orcid-identifier/common:path",
-        namespaces=NAMESPACES,
-    )
-    if len(elements) == 0:
+    if not ORCID_PATHS_XPATH(root):
         return None
 
     return response.text
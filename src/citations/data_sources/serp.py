@@ -1,8 +1,8 @@
 """Tools for extracting author information from Google Scholar using Serp."""
 
-import json
 import os
 
+import orjson
 import pandas as pd
 from pandas import DataFrame
 
@@ -26,15 +26,15 @@ def create_author_id_mapping(directory: str):
     """
     author_id_mapping = {}
 
-    for filename in os.listdir(directory):
-        if filename.endswith(".json"):
-            file_path = os.path.join(directory, filename)
-            with open(file_path, "r") as file:
-                data = json.load(file)
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith(".json"):
+                with open(entry.path, "rb") as file:
+                    data = orjson.loads(file.read())
                 profiles = data.get("profiles", [])
                 if len(profiles) == 1:
                     author_id = profiles[0].get("author_id")
-                    file_key = os.path.splitext(filename)[0]
+                    file_key = os.path.splitext(entry.name)[0]
                     author_id_mapping[file_key] = author_id
 
     return author_id_mapping
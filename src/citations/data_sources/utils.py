@@ -2,11 +2,11 @@
 
 import logging
 import os
-import xml
+import threading
 from typing import Dict, List
-from xml.etree import ElementTree as ET
 
 import pandas as pd
+from lxml import etree as ET
 from pandas import DataFrame, Series
 
 import citations.data_sources.orcid as orcid
@@ -19,6 +19,27 @@ from citations.dataframe import (
 
 logger = logging.getLogger(__name__)
 
+# lxml lets only one thread at a time use a parser, so every thread gets its own
+XML_PARSERS = threading.local()
+
+
+def get_xml_parser() -> ET.XMLParser:
+    """
+    Get the XML parser of the current thread.
+
+    The parser builds no id index and does not resolve entities.
+
+    Returns
+    -------
+    XMLParser
+        The parser, created on the first call from each thread.
+    """
+    parser = getattr(XML_PARSERS, "parser", None)
+    if parser is None:
+        parser = ET.XMLParser(collect_ids=False, resolve_entities=False)
+        XML_PARSERS.parser = parser
+    return parser
+
 
 def load_authors_state(checkpoint_dir: str, articles: pd.DataFrame, only_get_bbp_authors: bool) -> tuple:
     """
@@ -121,13 +142,13 @@ def load_authors_state(checkpoint_dir: str, articles: pd.DataFrame, only_get_bbp
     )
 
 
-def parse_xml(response_text: str) -> ET.Element | None:
+def parse_xml(response_text: str | bytes) -> ET._Element | None:
     """
     Parse XML response text and return ElementTree object.
 
     Parameters
     ----------
-    response_text : str
+    response_text : str | bytes
         The XML response text to be parsed.
 
     Returns
@@ -135,10 +156,13 @@ def parse_xml(response_text: str) -> ET.Element | None:
     Element | None
         The parsed XML element if successful, or None if there was an error parsing the XML.
     """
+    if isinstance(response_text, str):
+        # lxml refuses str input that carries an encoding declaration
+        response_text = response_text.encode("utf-8")
     try:
-        return ET.fromstring(response_text)
-    except xml.etree.ElementTree.ParseError:
-        logger.error(f"Error parsing XML: {response_text}")
+        return ET.fromstring(response_text, parser=get_xml_parser())
+    except ET.ParseError:
+        logger.error(f"Error parsing XML ({len(response_text)} bytes): {response_text[:500]!r}")
         return None
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}")
@@ -1,7 +1,11 @@
 """Init function for the embed package."""
 
 import json
-from typing import Dict, List
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+import orjson
 
 
 def load_embeddings(file_path: str) -> Dict[str, List[float]]:
@@ -26,3 +30,42 @@ def load_embeddings(file_path: str) -> Dict[str, List[float]]:
             embeddings_dict[data["article_uid"]] = data["vector"]
 
     return embeddings_dict
+
+
+def load_keyword_embeddings(file_path: str) -> Tuple[List[str], List[str], np.ndarray]:
+    """
+    Load keyword embeddings from a JSON Lines file into a float32 matrix.
+
+    The vectors are parsed straight into a preallocated array, so they never live in
+    memory as Python lists of floats.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the JSON Lines file with ``keyword``, ``model`` and ``vector`` fields.
+
+    Returns
+    -------
+    Tuple[List[str], List[str], np.ndarray]
+        The keywords, the model of each embedding and the ``(N, D)`` matrix of vectors,
+        empty if the file does not exist.
+    """
+    keywords: List[str] = []
+    models: List[str] = []
+    if not os.path.exists(file_path):
+        return keywords, models, np.empty((0, 0), dtype=np.float32)
+
+    with open(file_path, "rb") as f:
+        n_rows = sum(1 for line in f if line.strip())
+        f.seek(0)
+        vectors = np.empty((0, 0), dtype=np.float32)
+        for line in f:
+            if not line.strip():
+                continue
+            record = orjson.loads(line)
+            if not keywords:
+                vectors = np.empty((n_rows, len(record["vector"])), dtype=np.float32)
+            vectors[len(keywords)] = record["vector"]
+            keywords.append(record["keyword"])
+            models.append(record["model"])
+    return keywords, models, vectors
@@ -4,7 +4,7 @@ import json
 import logging
 
 import pandas as pd
-from neo4j import ManagedTransaction
+from neo4j import AsyncManagedTransaction, ManagedTransaction
 from neo4j.exceptions import Neo4jError
 
 CLUSTERING_ALGORITHMS = [
@@ -12,6 +12,11 @@ CLUSTERING_ALGORITHMS = [
     "kmeans_clusters",
 ]
 
+KEYWORD_SCHEMA_QUERIES = [
+    "CREATE CONSTRAINT keyword_name IF NOT EXISTS FOR (k:Keyword) REQUIRE k.name IS UNIQUE",
+    "CREATE CONSTRAINT article_uid IF NOT EXISTS FOR (a:Article) REQUIRE a.uid IS UNIQUE",
+]
+
 
 def create_constraints(tx: ManagedTransaction) -> None:
     """
@@ -28,6 +33,36 @@ def create_constraints(tx: ManagedTransaction) -> None:
     tx.run("CREATE CONSTRAINT FOR (k:Keyword) REQUIRE k.name IS UNIQUE")
 
 
+def create_keyword_schema(tx: ManagedTransaction) -> None:
+    """
+    Ensure the keys used by the keyword MERGE/MATCH queries are indexed.
+
+    Uniqueness constraints are backed by an index, so every MERGE becomes a point lookup.
+    Article.uid uses a constraint rather than a plain index because create_constraints
+    already defines one on that property and IF NOT EXISTS only skips equivalent schema.
+
+    Parameters
+    ----------
+    tx
+        A Neo4j transaction object
+    """
+    for query in KEYWORD_SCHEMA_QUERIES:
+        tx.run(query)
+
+
+async def acreate_keyword_schema(tx: AsyncManagedTransaction) -> None:
+    """
+    Ensure the keys used by the keyword MERGE/MATCH queries are indexed, in an async transaction.
+
+    Parameters
+    ----------
+    tx
+        An async Neo4j transaction object
+    """
+    for query in KEYWORD_SCHEMA_QUERIES:
+        await (await tx.run(query)).consume()
+
+
 def create_indexes(tx: ManagedTransaction) -> None:
     """
     Create indexes in the Neo4j database.
@@ -163,6 +198,38 @@ def execute_query_with_logging(tx, query, params=None):
         raise
 
 
+async def aexecute_query_with_logging(tx, query, params=None):
+    """
+    Execute a Neo4j query with logging in an async transaction.
+
+    Args:
+    ----
+        tx (neo4j.AsyncManagedTransaction): The transaction object used to run the query.
+        query (str): The Cypher query to be executed.
+        params (dict, optional): Parameters for the query. Defaults to None.
+
+    Returns:
+    -------
+        neo4j.ResultSummary: The summary of the query execution.
+
+    Raises:
+    ------
+        Neo4jError: If there is an error executing the query in Neo4j.
+        Exception: For any other unexpected errors.
+    """
+    try:
+        result = await tx.run(query, params)
+        summary = await result.consume()
+        logging.debug("Query executed successfully. Affected records:" f" {summary.counters}")
+        return summary
+    except Neo4jError as e:
+        logging.error(f"Neo4j Error: {e.message}. Query: {query}")
+        raise
+    except Exception as e:
+        logging.error(f"Unexpected error: {str(e)}. Query: {query}")
+        raise
+
+
 def batch_add_articles(tx: ManagedTransaction, articles: list[dict]) -> None:
     """
     Batch add articles to the Neo4j database.
@@ -1,10 +1,15 @@
 """Utility functions for interacting with a Neo4j database."""
 
+import asyncio
 import logging
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List
 
-from neo4j import ManagedTransaction, Transaction
+from neo4j import AsyncDriver, ManagedTransaction, Session, Transaction
 from neo4j.exceptions import ClientError
 
+from citations.neo4j.loader import aexecute_query_with_logging, execute_query_with_logging
+
 logging.basicConfig(level=logging.INFO)
 
 
@@ -207,3 +212,89 @@ def print_indexes(tx: ManagedTransaction) -> None:
     result = tx.run("CALL db.indexes()")
     for record in result:
         logging.info(record)
+
+
+def chunked(rows: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Yield successive lists of at most ``size`` rows.
+
+    Parameters
+    ----------
+    rows
+        Rows to split, consumed lazily.
+    size
+        Maximum number of rows per chunk.
+    """
+    iterator = iter(rows)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def write_in_chunks(
+    session: Session,
+    query: str,
+    rows: Iterable[Dict[str, Any]],
+    chunk_size: int,
+    params: Dict[str, Any] | None = None,
+) -> None:
+    """
+    Run an ``UNWIND $rows`` query once per chunk, each chunk in its own write transaction.
+
+    Parameters
+    ----------
+    session
+        A Neo4j session.
+    query
+        Cypher query reading its input from the ``$rows`` parameter.
+    rows
+        Rows to write.
+    chunk_size
+        Maximum number of rows sent with one query.
+    params
+        Additional query parameters shared by every chunk.
+    """
+    for chunk in chunked(rows, chunk_size):
+        session.execute_write(execute_query_with_logging, query, {**(params or {}), "rows": chunk})
+
+
+async def awrite_in_chunks(
+    driver: AsyncDriver,
+    query: str,
+    rows: Iterable[Dict[str, Any]],
+    chunk_size: int,
+    params: Dict[str, Any] | None = None,
+    max_concurrency: int = 10,
+    database: str | None = None,
+) -> None:
+    """
+    Run an ``UNWIND $rows`` query once per chunk, with several chunks in flight at once.
+
+    Every chunk is written in its own session and transaction so that chunks overlap their
+    network round trips. Concurrent chunks must touch disjoint nodes: chunks that merge or lock
+    the same nodes wait on each other and can deadlock, so write those with ``max_concurrency=1``.
+
+    Parameters
+    ----------
+    driver
+        An async Neo4j driver.
+    query
+        Cypher query reading its input from the ``$rows`` parameter.
+    rows
+        Rows to write.
+    chunk_size
+        Maximum number of rows sent with one query.
+    params
+        Additional query parameters shared by every chunk.
+    max_concurrency
+        Maximum number of chunks written at the same time; keep it below the connection pool size.
+    database
+        Name of the database to write to.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def write_chunk(chunk: List[Dict[str, Any]]) -> None:
+        async with semaphore:
+            async with driver.session(database=database) as session:
+                await session.execute_write(aexecute_query_with_logging, query, {**(params or {}), "rows": chunk})
+
+    await asyncio.gather(*[write_chunk(chunk) for chunk in chunked(rows, chunk_size)])
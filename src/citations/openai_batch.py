@@ -0,0 +1,174 @@
+"""Run bulk OpenAI requests through the Batch API."""
+
+import asyncio
+import logging
+from typing import Any, Dict, Iterator, List
+
+import orjson
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+# Limits per batch input file imposed by the Batch API: the number of requests, the number of
+# embedding inputs summed over all requests, and the size of the file
+MAX_REQUESTS_PER_BATCH = 50_000
+MAX_INPUTS_PER_BATCH = 50_000
+MAX_BATCH_FILE_BYTES = 200 * 1024 * 1024
+FINAL_BATCH_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+async def submit_and_wait(
+    client: AsyncOpenAI,
+    input_path: str,
+    endpoint: Any,
+    poll_interval: float = 60,
+) -> List[Dict[str, Any]]:
+    """
+    Upload one batch input file, wait for the batch to finish and return its output lines.
+
+    Parameters
+    ----------
+    client
+        OpenAI client.
+    input_path
+        Path to the JSONL batch input file.
+    endpoint
+        API endpoint the requests are sent to, e.g. ``/v1/embeddings``.
+    poll_interval
+        Seconds to wait between status checks.
+
+    Returns
+    -------
+    list
+        Parsed lines of the batch output file.
+    """
+    with open(input_path, "rb") as f:
+        input_file = await client.files.create(file=f, purpose="batch")
+    batch = await client.batches.create(input_file_id=input_file.id, endpoint=endpoint, completion_window="24h")
+    logger.info(f"Submitted batch {batch.id} from {input_path}")
+
+    while batch.status not in FINAL_BATCH_STATUSES:
+        await asyncio.sleep(poll_interval)
+        batch = await client.batches.retrieve(batch.id)
+
+    if batch.status != "completed":
+        logger.error(f"Batch {batch.id} ended with status {batch.status}")
+    if batch.error_file_id:
+        logger.warning(f"Batch {batch.id} has failed requests, see file {batch.error_file_id}")
+    if not batch.output_file_id:
+        return []
+
+    output = await client.files.content(batch.output_file_id)
+    return [orjson.loads(line) for line in output.content.splitlines() if line.strip()]
+
+
+def count_inputs(body: Dict[str, Any]) -> int:
+    """
+    Count the inputs of a request body, as counted by the Batch API input limit.
+
+    Parameters
+    ----------
+    body
+        Request body.
+
+    Returns
+    -------
+    int
+        The number of embedding inputs of an embedding request, 1 for other requests.
+    """
+    inputs = body.get("input")
+    return len(inputs) if isinstance(inputs, list) else 1
+
+
+def split_batch_lines(requests: Dict[str, Dict[str, Any]], endpoint: Any) -> Iterator[List[bytes]]:
+    """
+    Serialize requests into batch input lines, split into parts that each fit in one batch.
+
+    A part ends before it would exceed ``MAX_REQUESTS_PER_BATCH`` lines, ``MAX_INPUTS_PER_BATCH``
+    inputs or ``MAX_BATCH_FILE_BYTES`` bytes.
+
+    Parameters
+    ----------
+    requests
+        Request bodies keyed by a custom ID unique within the run.
+    endpoint
+        API endpoint the requests are sent to, e.g. ``/v1/embeddings``.
+
+    Yields
+    ------
+    list
+        The JSONL lines of one batch input file.
+    """
+    lines: List[bytes] = []
+    n_inputs = 0
+    n_bytes = 0
+    for custom_id, body in requests.items():
+        line = orjson.dumps(
+            {"custom_id": custom_id, "method": "POST", "url": endpoint, "body": body},
+            option=orjson.OPT_APPEND_NEWLINE,
+        )
+        line_inputs = count_inputs(body)
+        if lines and (
+            len(lines) == MAX_REQUESTS_PER_BATCH
+            or n_inputs + line_inputs > MAX_INPUTS_PER_BATCH
+            or n_bytes + len(line) > MAX_BATCH_FILE_BYTES
+        ):
+            yield lines
+            lines, n_inputs, n_bytes = [], 0, 0
+        lines.append(line)
+        n_inputs += line_inputs
+        n_bytes += len(line)
+    if lines:
+        yield lines
+
+
+async def run_batch(
+    client: AsyncOpenAI,
+    requests: Dict[str, Dict[str, Any]],
+    endpoint: Any,
+    input_path: str,
+    poll_interval: float = 60,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Send requests through the OpenAI Batch API and collect the successful responses.
+
+    The requests are written to JSONL input files that stay within the Batch API limits on
+    requests, inputs and file size, which are submitted as concurrent batches and polled until
+    they finish.
+
+    Parameters
+    ----------
+    client
+        OpenAI client.
+    requests
+        Request bodies keyed by a custom ID unique within the run.
+    endpoint
+        API endpoint the requests are sent to, e.g. ``/v1/embeddings``.
+    input_path
+        Path prefix of the JSONL batch input files; a part number is appended to it.
+    poll_interval
+        Seconds to wait between status checks.
+
+    Returns
+    -------
+    dict
+        Response bodies keyed by custom ID. Failed requests are logged and left out.
+    """
+    input_paths = []
+    for part, lines in enumerate(split_batch_lines(requests, endpoint)):
+        path = f"{input_path}.{part}.jsonl"
+        with open(path, "wb") as f:
+            f.writelines(lines)
+        input_paths.append(path)
+
+    outputs = await asyncio.gather(*[submit_and_wait(client, path, endpoint, poll_interval) for path in input_paths])
+
+    responses = {}
+    for output in outputs:
+        for line in output:
+            response = line.get("response") or {}
+            if response.get("status_code") == 200:
+                responses[line["custom_id"]] = response["body"]
+            else:
+                logger.error(f"Batch request {line['custom_id']} failed: {line.get('error') or response}")
+    return responses
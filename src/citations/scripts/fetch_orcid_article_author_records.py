@@ -5,14 +5,15 @@ import logging
 import os
 import pathlib
 from glob import glob
-from xml.etree import ElementTree as ET
 
 import pandas as pd
 from httpx import HTTPError, HTTPStatusError, RequestError
+from lxml import etree as ET
 from pandas import DataFrame
 from tqdm import tqdm
 
 from citations.data_sources.orcid import NAMESPACES, get_article_from_endpoint, get_orcidids_from_author_names
+from citations.data_sources.utils import get_xml_parser
 from citations.utils import get_with_waiting, load_europmc_xmls
 
 logger = logging.getLogger(__name__)
@@ -89,13 +90,13 @@ def fetch_authors_by_europmc_record(europmc_article_xmls_path: str, orcid_author
                 continue
 
             try:
-                record = ET.fromstring(response.text)
+                record = ET.fromstring(response.content, parser=get_xml_parser())
                 if record is None:
                     continue
             except ET.ParseError:
                 continue
-            with open(author_path, "w") as f:
-                f.write(response.text)
+            with open(author_path, "wb") as f:
+                f.write(response.content)
 
 
 def main(
@@ -174,17 +175,16 @@ def fetch_authors_by_author_name(articles_path: str, bbp_articles_path: str, orc
         if len(article_orcid_ids) == 0:
             continue
 
+        search_ns = f"{{{NAMESPACES['search']}}}"
+        common_ns = f"{{{NAMESPACES['common']}}}"
         root = ET.Element(
-            "search:search",
-            {
-                "xmlns:search": NAMESPACES["search"],
-                "xmlns:common": NAMESPACES["common"],
-            },
+            f"{search_ns}search",
+            nsmap={"search": NAMESPACES["search"], "common": NAMESPACES["common"]},
         )
         for orcid_id in article_orcid_ids:  # lots of dan kellers
-            result = ET.SubElement(root, "search:result")
-            orcid_identifier = ET.SubElement(result, "common:orcid-identifier")
-            element = ET.SubElement(orcid_identifier, "common:path")
+            result = ET.SubElement(root, f"{search_ns}result")
+            orcid_identifier = ET.SubElement(result, f"{common_ns}orcid-identifier")
+            element = ET.SubElement(orcid_identifier, f"{common_ns}path")
             element.text = orcid_id
         tree = ET.ElementTree(root)
         tree.write(path)
@@ -209,10 +209,10 @@ def fetch_authors_by_orcidid(orcid_article_records_dir: str, orcid_author_record
     """
     article_xmls = glob(os.path.join(orcid_article_records_dir, "*.xml"))
     for article_xml in tqdm(article_xmls):
-        with open(article_xml) as f:
+        with open(article_xml, "rb") as f:
             content = f.read()
 
-        root = ET.fromstring(content)
+        root = ET.fromstring(content, parser=get_xml_parser())
 
         elements = root.findall(
             "./search:result/common:orcid-identifier/common:path",
@@ -227,13 +227,13 @@ def fetch_authors_by_orcidid(orcid_article_records_dir: str, orcid_author_record
             response = get_with_waiting(endpoint)
 
             try:
-                record = ET.fromstring(response.text)
+                record = ET.fromstring(response.content, parser=get_xml_parser())
                 if record is None:
                     continue
             except ET.ParseError:
                 continue
-            with open(author_path, "w") as f:
-                f.write(response.text)
+            with open(author_path, "wb") as f:
+                f.write(response.content)
 
 
 def fetch_article_records(articles: DataFrame, orcid_article_records_dir: str) -> None:
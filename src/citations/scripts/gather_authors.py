@@ -6,12 +6,13 @@ import os
 import pathlib
 import re
 from glob import glob
-from xml.etree import ElementTree as ET
 
 import pandas as pd
+from lxml import etree as ET
 from tqdm import tqdm
 
 from citations.data_sources.orcid import NAMESPACES, get_author_affiliations, get_author_name
+from citations.data_sources.utils import get_xml_parser
 from citations.schemas import Author, AuthorWroteArticle
 
 logger = logging.getLogger(__name__)
@@ -33,7 +34,7 @@ def load_europmc_article_author_mapping(europmc_article_xmls_path: str, article_
     for filename in os.listdir(europmc_article_xmls_path):
         if filename.endswith(".xml"):
             file_path = os.path.join(europmc_article_xmls_path, filename)
-            tree = ET.parse(file_path)
+            tree = ET.parse(file_path, parser=get_xml_parser())
             root = tree.getroot()
             file_key = os.path.splitext(filename)[0]
             orcidids = [
@@ -74,7 +75,7 @@ def main(
         article_uid = basename[:-4]
         if article_uid not in article_uids:
             continue
-        tree = ET.parse(article_xml_path)
+        tree = ET.parse(article_xml_path, parser=get_xml_parser())
         element = tree.getroot()
         orcidids = [orcid.text for orcid in element.findall(".//common:path", namespaces=NAMESPACES)]
         article_author_mapping[article_uid] = orcidids
@@ -87,7 +88,7 @@ def main(
         basename = os.path.basename(xml_path)
         orcidid = basename[:-4]
         if orcidid not in author_record_map:
-            tree = ET.parse(xml_path)
+            tree = ET.parse(xml_path, parser=get_xml_parser())
             element = tree.getroot()
             author_record_map[orcidid] = element
 
@@ -89,12 +89,14 @@ class AsyncSerpApiCitationChecker:
         The maximum number of requests allowed per hour.
     rate_limit_reached : bool
         A flag indicating if the rate limit has been reached.
+    max_concurrency : int
+        The maximum number of articles processed concurrently.
     session : aiohttp.ClientSession
         The aiohttp session for making HTTP requests.
 
     Methods
     -------
-    __init__(api_key, csv_file, output_dir)
+    __init__(api_key, csv_file, output_dir, max_concurrency)
         Initializes the AsyncSerpApiCitationChecker with the given API key, CSV file, and output directory.
 
     check_rate_limit()
@@ -104,7 +106,7 @@ class AsyncSerpApiCitationChecker:
         Asynchronously makes an API request with the given parameters and returns the response data.
     """
 
-    def __init__(self, api_key: str, csv_file: str, output_dir: str):
+    def __init__(self, api_key: str, csv_file: str, output_dir: str, max_concurrency: int = 8):
         self.api_key = api_key
         self.csv_file = csv_file
         self.output_dir = output_dir
@@ -113,6 +115,7 @@ class AsyncSerpApiCitationChecker:
         self.requests_made = 0
         self.max_requests_per_hour = 1000
         self.rate_limit_reached = False
+        self.max_concurrency = max_concurrency
         os.makedirs(self.output_dir, exist_ok=True)
         self.session: aiohttp.ClientSession | None = None
 
@@ -512,6 +515,49 @@ class AsyncSerpApiCitationChecker:
 
         return None
 
+    async def process_article(
+        self,
+        row: Dict,
+        output_file: str,
+        semaphore: asyncio.Semaphore,
+        write_lock: asyncio.Lock,
+        pbar: tqdm,
+    ) -> bool:
+        """
+        Process a single article and append its result to the output file.
+
+        Args:
+        ----
+            row (Dict): A dictionary representing a row of data from the CSV file.
+            output_file (str): Path of the JSONL file the result is appended to.
+            semaphore (asyncio.Semaphore): Bounds the number of articles processed concurrently.
+            write_lock (asyncio.Lock): Serializes writes to the output file.
+            pbar (tqdm): Progress bar updated once the article has been processed.
+
+        Returns:
+        -------
+            bool: True if a result was written for this article.
+        """
+        async with semaphore:
+            # Articles still waiting when the rate limit is reached are skipped
+            if self.rate_limit_reached:
+                return False
+            try:
+                row_result = await self.process_row(row, fetch_citations=True)
+            except Exception as e:
+                if not self.rate_limit_reached:
+                    logging.error("Error processing row for title" f" '{row['title']}': {str(e)}")
+                return False
+            finally:
+                pbar.update(1)
+
+            if not row_result:
+                return False
+            async with write_lock:
+                async with aiofiles.open(output_file, "a") as f:
+                    await f.write(json.dumps(row_result) + "\n")
+            return True
+
     async def process_csv(self):
         """
         Process the CSV file to fetch and store citation data.
@@ -530,7 +576,6 @@ class AsyncSerpApiCitationChecker:
             json.JSONDecodeError: If there is an error decoding JSON data
             from the existing results file.
         """
-        num_results = 0
         output_file = os.path.join(self.output_dir, "serp_citation_results.jsonl")
         logging.info(f"\n\nStarting Processing articles from {self.csv_file}")
 
@@ -564,28 +609,22 @@ class AsyncSerpApiCitationChecker:
                         f"Skipping article '{row['title']}' as it is already" " processed or doesn't meet criteria."
                     )
 
-        # Now process the filtered articles
-        async with aiohttp.ClientSession() as self.session:
+        # Now process the filtered articles, at most max_concurrency at a time
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        write_lock = asyncio.Lock()
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+        async with aiohttp.ClientSession(connector=connector) as self.session:
             with tqdm(total=len(articles_to_process), desc="Processing articles") as pbar:
-                for row in articles_to_process:
-                    try:
-                        row_result = await self.process_row(row, fetch_citations=True)
-                        if row_result:
-                            num_results += 1
-                            async with aiofiles.open(output_file, "a") as f:
-                                await f.write(json.dumps(row_result) + "\n")
-                    except Exception as e:
-                        if self.rate_limit_reached:
-                            logging.warning("Rate limit reached. Stopping processing.")
-                            break
-                        else:
-                            logging.error("Error processing row for title" f" '{row['title']}': {str(e)}")
-                    # Update progress bar only if article was processed
-                    pbar.update(1)
-
-                    if self.rate_limit_reached:
-                        logging.warning("Rate limit reached. Stopping processing.")
-                        break
+                processed = await asyncio.gather(
+                    *(
+                        self.process_article(row, output_file, semaphore, write_lock, pbar)
+                        for row in articles_to_process
+                    )
+                )
+        num_results = sum(processed)
+
+        if self.rate_limit_reached:
+            logging.warning("Rate limit reached. Stopping processing.")
 
         logging.info(f"Results saved to {output_file}")
         return num_results
@@ -620,6 +659,12 @@ def get_parser():
         default="output",
         help="Directory to save the output JSONL file.",
     )
+    parser.add_argument(
+        "--max_concurrency",
+        type=int,
+        default=8,
+        help="Number of articles to process concurrently.",
+    )
     return parser
 
 
@@ -650,7 +695,7 @@ async def main():
     articles = args.articles_csv
     output_dir = args.output_dir
 
-    checker = AsyncSerpApiCitationChecker(api_key, articles, output_dir)
+    checker = AsyncSerpApiCitationChecker(api_key, articles, output_dir, max_concurrency=args.max_concurrency)
     num_results = await checker.process_csv()
 
     logging.info(f"Processed {num_results} articles for citations.")
@@ -5,9 +5,11 @@ SERP Data Processor.
 This script processes a JSONL file containing SERP API data and generates
 four CSV files: articles_serp.csv, authors_serp.csv,
 author_wrote_article_serp.csv, and article_cites_article_serp.csv.
+The same tables can be written as Parquet or Feather files instead, which
+requires pyarrow.
 
 Usage:
-    python serp_data_processor.py --input <input_file> --output <output_directory>
+    python serp_data_processor.py --input <input_file> --output <output_directory> [--format csv|parquet|feather]
 
 Author: Kerem Kurban
 Date: 24.08.2024
@@ -15,167 +17,161 @@ Date: 24.08.2024
 
 import argparse
 import csv
-import json
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple
 
-import pandas as pd
+import orjson
 
+ARTICLES_SERP_COLUMNS = ["article_id", "citations", "title", "link"]
+AUTHORS_SERP_COLUMNS = ["author_id", "name"]
+AUTHOR_WROTE_ARTICLE_SERP_COLUMNS = ["author_id", "article_id"]
+ARTICLE_CITES_ARTICLE_SERP_COLUMNS = ["source", "target"]
 
-def read_jsonl(file_path: str) -> List[Dict[str, Any]]:
+OUTPUT_FORMATS = ["csv", "parquet", "feather"]
+
+
+def read_jsonl(file_path: str) -> Iterator[Dict[str, Any]]:
     """
-    Read JSONL file and return a list of dictionaries.
+    Read JSONL file and yield one dictionary per line.
 
     Args:
     ----
         file_path (str): Path to the input JSONL file.
 
-    Returns:
-    -------
-        List[Dict[str, Any]]: List of dictionaries containing the JSONL data.
+    Yields:
+    ------
+        Dict[str, Any]: Dictionary containing the data of a single JSONL line.
     """
-    with open(file_path, "r", encoding="utf-8") as file:
-        return [json.loads(line) for line in file]
+    with open(file_path, "rb") as file:
+        for line in file:
+            # A line holds one article and Google Scholar serves at most 1000 citations per article,
+            # so parsing whole lines keeps memory bounded without an incremental parser like ijson.
+            yield orjson.loads(line)
 
 
-def write_csv(file_path: str, headers: List[str], data: List[List[Any]]) -> None:
+def write_csv(file_path: str | Path, headers: List[str], data: Iterable[Sequence[Any]]) -> None:
     """
     Write data to a CSV file.
 
     Args:
     ----
-        file_path (str): Path to the output CSV file.
+        file_path (str | Path): Path to the output CSV file.
         headers (List[str]): List of column headers.
-        data (List[List[Any]]): List of rows to write to the CSV.
+        data (Iterable[Sequence[Any]]): Rows to write to the CSV.
     """
     with open(file_path, "w", newline="", encoding="utf-8") as file:
-        writer = csv.writer(file)
+        writer = csv.writer(file, lineterminator="\n")
         writer.writerow(headers)
         writer.writerows(data)
 
 
-def process_articles(data: List[Dict[str, Any]]) -> pd.DataFrame:
+def write_table(
+    output_path: Path,
+    name: str,
+    headers: List[str],
+    data: Sequence[Sequence[Any]],
+    output_format: str = "csv",
+) -> None:
     """
-    Process articles data for articles_serp.csv.
+    Write a table to ``output_path`` in the requested format.
 
     Args:
     ----
-        data (List[Dict[str, Any]]): List of dictionaries containing JSONL data.
-
-    Returns:
-    -------
-        pd.DataFrame: Processed data for articles_serp.csv.
-    """
-    total_bbp_citations = 0
-    total_bbp_articles = 0
-    articles = []
-    for item in data:
-        articles.append(
-            [
-                item["article_id"],
-                item["total_citations"],
-                item["title"],
-            ]
-        )
-        total_bbp_citations += item["total_citations"]
-        total_bbp_articles += 1
-        for citation in item.get("citations", []):
-            articles.append(
-                [
-                    citation["result_id"],
-                    citation.get("cited_by", 0),
-                    citation.get("title", ""),
-                    citation.get("link", ""),
-                    # Add other relevant fields here
-                ]
-            )
-    # convert to pandas df and drop duplicates based on article_id and result_id
-    articles_df = pd.DataFrame(articles, columns=["article_id", "citations", "title", "link"])
-    articles_df = articles_df.drop_duplicates(subset=["article_id", "title"])
-
-    print(f"Total BBP citations: {total_bbp_citations} out of" f" {total_bbp_articles} articles")
-    return articles_df
-
-
-def process_authors(data: List[Dict[str, Any]]) -> pd.DataFrame:
+        output_path (Path): Directory to write the table to.
+        name (str): Name of the table, used as the file name without extension.
+        headers (List[str]): List of column headers.
+        data (Sequence[Sequence[Any]]): Rows of the table.
+        output_format (str): One of OUTPUT_FORMATS, Parquet and Feather files are compressed with zstd.
     """
-    Process authors data for authors_serp.csv.
+    file_path = output_path / f"{name}.{output_format}"
+    if output_format == "csv":
+        write_csv(file_path, headers, data)
+        return
+
+    # Only needed for the columnar formats
+    import pyarrow as pa
+    import pyarrow.feather
+    import pyarrow.parquet
+
+    try:
+        pool = pa.jemalloc_memory_pool()
+    except NotImplementedError:
+        # pyarrow was built without jemalloc
+        pool = pa.default_memory_pool()
+
+    # Build the Arrow columns straight from the rows, without an intermediate DataFrame
+    columns = list(zip(*data)) if data else [() for _ in headers]
+    table = pa.Table.from_arrays(
+        [pa.array(column, memory_pool=pool) for column in columns],
+        names=headers,
+    )
+    if output_format == "parquet":
+        pa.parquet.write_table(table, file_path, compression="zstd")
+    elif output_format == "feather":
+        pa.feather.write_feather(table, file_path, compression="zstd")
+    else:
+        raise ValueError(f"Unknown output format: {output_format}")
 
-    Args:
-    ----
-        data (List[Dict[str, Any]]): List of dictionaries containing JSONL data.
 
-    Returns:
-    -------
-        pd.DataFrame: Processed data for authors_serp.csv.
+def process_all(
+    data: Iterable[Dict[str, Any]],
+) -> Tuple[List[Tuple[Any, ...]], List[Tuple[str, str]], List[Tuple[str, str]], List[Tuple[str, str]]]:
     """
-    authors = set()
-    for item in data:
-        for citation in item.get("citations", []):
-            for author in citation.get("authors", []):
-                authors.add((author["author_id"], author["name"]))
-
-    # convert to pandas df and drop duplicates based on author_id
-    authors_df = pd.DataFrame(authors, columns=["author_id", "name"])
-    authors_df = authors_df.drop_duplicates(subset=["author_id"])
+    Process the SERP data for all four CSV files in a single pass.
 
-    return authors_df
-
-
-def process_author_wrote_article(
-    data: List[Dict[str, Any]],
-) -> pd.DataFrame:
-    """
-    Process data for author_wrote_article_serp.csv.
+    Each item of ``data`` is only visited once, so ``data`` can be a generator
+    such as the one returned by ``read_jsonl``.
 
     Args:
     ----
-        data (List[Dict[str, Any]]): List of dictionaries containing JSONL data.
+        data (Iterable[Dict[str, Any]]): Dictionaries containing JSONL data.
 
     Returns:
     -------
-        pd.DataFrame: Processed data for author_wrote_article_serp.csv.
+        Tuple[List[Tuple[Any, ...]], List[Tuple[str, str]], List[Tuple[str, str]], List[Tuple[str, str]]]:
+        Unique rows for articles_serp.csv, authors_serp.csv, author_wrote_article_serp.csv and
+        article_cites_article_serp.csv.
     """
-    author_wrote_article = []
+    total_bbp_citations = 0
+    total_bbp_articles = 0
+    # rows are deduplicated on insertion, dicts are used as ordered sets
+    # article rows are tuples and only built for keys that were not seen yet
+    articles: Dict[Tuple[str, str], Tuple[Any, ...]] = {}
+    authors: Dict[str, str] = {}
+    author_wrote_article: Dict[Tuple[str, str], None] = {}
+    article_cites_article: Dict[Tuple[str, str], None] = {}
     for item in data:
+        key = (item["article_id"], item["title"])
+        if key not in articles:
+            articles[key] = (item["article_id"], item["total_citations"], item["title"], None)
+        total_bbp_citations += item["total_citations"]
+        total_bbp_articles += 1
         for citation in item.get("citations", []):
+            key = (citation["result_id"], citation.get("title", ""))
+            if key not in articles:
+                articles[key] = (
+                    citation["result_id"],
+                    citation.get("cited_by", 0),
+                    key[1],
+                    citation.get("link", ""),
+                    # Add other relevant fields here
+                )
+            article_cites_article[(citation["result_id"], item["article_id"])] = None
             for author in citation.get("authors", []):
-                author_wrote_article.append([author["author_id"], citation["result_id"]])
-
-    # convert to pandas df and drop duplicates based on author_id,article_id pair
-    author_wrote_article_df = pd.DataFrame(author_wrote_article, columns=["author_id", "article_id"])
-    author_wrote_article_df = author_wrote_article_df.drop_duplicates(subset=["author_id", "article_id"])
-
-    return author_wrote_article_df
-
-
-def process_article_cites_article(
-    data: List[Dict[str, Any]],
-) -> pd.DataFrame:
-    """
-    Process data for article_cites_article_serp.csv.
+                authors.setdefault(author["author_id"], author["name"])
+                author_wrote_article[(author["author_id"], citation["result_id"])] = None
 
-    Args:
-    ----
-        data (List[Dict[str, Any]]): List of dictionaries containing JSONL data.
-
-    Returns:
-    -------
-        pd.DataFrame: Processed data for article_cites_article_serp.csv.
-    """
-    article_cites_article = []
-    for item in data:
-        for citation in item.get("citations", []):
-            article_cites_article.append([citation["result_id"], item["article_id"]])
-
-    # convert to pandas df and drop duplicates based on source and target
-    article_cites_article_df = pd.DataFrame(article_cites_article, columns=["source", "target"])
-    article_cites_article_df = article_cites_article_df.drop_duplicates(subset=["source", "target"])
+    print(f"Total BBP citations: {total_bbp_citations} out of" f" {total_bbp_articles} articles")
 
-    return article_cites_article_df
+    return (
+        list(articles.values()),
+        list(authors.items()),
+        list(author_wrote_article),
+        list(article_cites_article),
+    )
 
 
-def main(input_file: str, output_dir: str) -> None:
+def main(input_file: str, output_dir: str, output_format: str = "csv") -> None:
     """
     Process JSONL and create CSV files.
 
@@ -183,26 +179,37 @@ def main(input_file: str, output_dir: str) -> None:
     ----
         input_file (str): Path to the input JSONL file containing article and author info from SERP
         output_dir (str): Directory to save the output CSV files.
+        output_format (str): Format of the output files, one of OUTPUT_FORMATS.
     """
-    data = read_jsonl(input_file)
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
 
-    # Process and write articles_serp.csv
-    articles = process_articles(data)
-    articles.to_csv(output_path / "articles_serp.csv", index=False)
+    # Process all four tables in a single pass over the JSONL file
+    articles, authors, author_wrote_article, article_cites_article = process_all(read_jsonl(input_file))
+
+    # Write articles_serp
+    write_table(output_path, "articles_serp", ARTICLES_SERP_COLUMNS, articles, output_format)
 
-    # Process and write authors_serp.csv
-    authors = process_authors(data)
-    authors.to_csv(output_path / "authors_serp.csv", index=False)
+    # Write authors_serp
+    write_table(output_path, "authors_serp", AUTHORS_SERP_COLUMNS, authors, output_format)
 
-    # Process and write author_wrote_article_serp.csv
-    author_wrote_article = process_author_wrote_article(data)
-    author_wrote_article.to_csv(output_path / "author_wrote_article_serp.csv", index=False)
+    # Write author_wrote_article_serp
+    write_table(
+        output_path,
+        "author_wrote_article_serp",
+        AUTHOR_WROTE_ARTICLE_SERP_COLUMNS,
+        author_wrote_article,
+        output_format,
+    )
 
-    # Process and write article_cites_article_serp.csv
-    article_cites_article = process_article_cites_article(data)
-    article_cites_article.to_csv(output_path / "article_cites_article_serp.csv", index=False)
+    # Write article_cites_article_serp
+    write_table(
+        output_path,
+        "article_cites_article_serp",
+        ARTICLE_CITES_ARTICLE_SERP_COLUMNS,
+        article_cites_article,
+        output_format,
+    )
 
     # log how many articles, authors, author_wrote_article, article_cites_article
     print(f"Number of articles: {len(articles)}")
@@ -219,6 +226,12 @@ if __name__ == "__main__":
         required=True,
         help="Directory to save the output CSV files",
     )
+    parser.add_argument(
+        "--format",
+        choices=OUTPUT_FORMATS,
+        default="csv",
+        help="Format of the output files, parquet and feather require pyarrow",
+    )
     args = parser.parse_args()
 
-    main(args.input, args.output)
+    main(args.input, args.output, args.format)
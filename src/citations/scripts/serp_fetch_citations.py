@@ -2,12 +2,17 @@
 
 import argparse
 import csv
-import json
 import logging
 import os
+import threading
 import time
-from typing import Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from operator import itemgetter
+from typing import Dict, NamedTuple, Optional
 
+import orjson
 import requests
 from dotenv import load_dotenv
 from ratelimit import limits, sleep_and_retry
@@ -19,6 +24,49 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
 
+class ArticleRow(NamedTuple):
+    """The columns of the articles CSV file used to look up citations."""
+
+    title: str
+    doi: str
+    pmid: str
+    url: str
+    isbns: str
+    is_bbp: str
+    is_published: str
+
+
+@lru_cache(maxsize=1)
+def format_timestamp(seconds: int) -> str:
+    """Format a UTC timestamp, cached so bursts of calls within the same second only format it once."""
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(seconds))
+
+
+def extract_citation_info(citation: Dict) -> Dict:
+    """
+    Extract the fields we keep from a single SerpApi citation result.
+
+    Args:
+    ----
+    citation : Dict
+        An element of the "organic_results" list returned by the SerpApi.
+
+    Returns:
+    -------
+    Dict
+        The title, result ID, link, authors and cited-by count of the citation.
+    """
+    authors = citation.get("publication_info", {}).get("authors", [])
+    cited_by = citation.get("inline_links", {}).get("cited_by", {})
+    return {
+        "title": citation.get("title"),
+        "result_id": citation.get("result_id"),
+        "link": citation.get("link"),
+        "authors": [{"name": author.get("name"), "author_id": author.get("author_id")} for author in authors],
+        "cited_by": cited_by.get("total") if cited_by else None,
+    }
+
+
 class SerpApiCitationChecker:
     """
     A class to check citations for articles using the SerpApi.
@@ -41,23 +89,55 @@ class SerpApiCitationChecker:
         The number of API requests made.
     max_requests_per_hour : int
         The maximum number of API requests allowed per hour.
+    max_workers : int
+        The number of rows processed concurrently.
+    session : requests.Session
+        The HTTP session reused across requests to keep connections to the SerpApi alive.
+    exceptions_file : TextIO
+        The buffered JSONL file exceptions are appended to, closed by `close`.
+    checkpoint_file : str
+        The path of the checkpoint used to resume an interrupted `process_csv` run.
 
     Methods:
     -------
     make_api_request(params: Dict) -> Dict
         Makes a request to the SerpApi with the given parameters and returns the response data.
-    get_article_id(row: Dict) -> Optional[str]
+    get_article_id(row: ArticleRow) -> Optional[str]
         Retrieves the article ID for a given row of article data.
     """
 
-    def __init__(self, api_key: str, csv_file: str, output_dir: str):
+    def __init__(self, api_key: str, csv_file: str, output_dir: str, max_workers: int = 16):
         self.api_key = api_key
         self.csv_file = csv_file
         self.output_dir = output_dir
         self.base_url = "https://serpapi.com/search.json"
         self.requests_made = 0
         self.max_requests_per_hour = 1000
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
         os.makedirs(self.output_dir, exist_ok=True)
+        self.checkpoint_file = os.path.join(self.output_dir, "serp_fetch_checkpoint.json")
+        self.exceptions_file = open(
+            os.path.join(self.output_dir, "serp_api_exceptions.json"),
+            "a",
+            buffering=1 << 16,
+        )
+
+    def __enter__(self):
+        """Return the checker itself so it can be used as a context manager."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Close the checker when leaving the context."""
+        self.close()
+
+    def close(self):
+        """Flush and close the exceptions file and the HTTP session."""
+        self.exceptions_file.close()
+        self.session.close()
 
     @sleep_and_retry
     @limits(calls=1000, period=3600)
@@ -86,12 +166,13 @@ class SerpApiCitationChecker:
         Exception
             If there is an error during the API request.
         """
-        self.requests_made += 1
-        response = requests.get(self.base_url, params=params)
+        with self._lock:
+            self.requests_made += 1
+        response = self.session.get(self.base_url, params=params, timeout=30)
         response.raise_for_status()
         return response.json()
 
-    def get_article_id(self, row: Dict) -> Optional[str]:
+    def get_article_id(self, row: ArticleRow) -> Optional[str]:
         """
         Retrieve the article ID from a given row of article data.
 
@@ -101,8 +182,8 @@ class SerpApiCitationChecker:
 
         Args:
         ----
-        row : Dict
-            A dictionary containing article data with fields like title, DOI, PMID, URL, and ISBNs.
+        row : ArticleRow
+            The article data with fields like title, DOI, PMID, URL, and ISBNs.
 
         Returns:
         -------
@@ -114,19 +195,15 @@ class SerpApiCitationChecker:
         Exception
             If there is an error during the API request.
         """
-        title = row.get("title", "")
-        doi = row.get("doi", "")
-        pmid = row.get("pmid", "")
-        url = row.get("url", "")
-        isbns = row.get("isbns", "")
-
+        title = row.title
         search_fields = [
             ("title", title),
-            ("doi", doi),
-            ("pmid", pmid),
-            ("url", url),
-            ("isbns", isbns),
+            ("doi", row.doi),
+            ("pmid", row.pmid),
+            ("url", row.url),
+            ("isbns", row.isbns),
         ]
+        title_lc = title.lower()
 
         for field_name, field_value in search_fields:
             if not field_value:
@@ -144,10 +221,11 @@ class SerpApiCitationChecker:
                 self.save_exception("get_article_id", "", field_value, str(e))
                 continue
 
+            # Title searches need an exact match, identifier searches only need to contain the title
+            exact_match = field_name == "title"
             for result in data.get("organic_results", []):
-                if field_name == "title" and result["title"].lower() == title.lower():
-                    return result["result_id"]
-                elif field_name in ["doi", "pmid", "url", "isbns"] and title.lower() in result["title"].lower():
+                result_title_lc = result["title"].lower()
+                if (result_title_lc == title_lc) if exact_match else (title_lc in result_title_lc):
                     return result["result_id"]
 
         logging.warning(f"No article ID found for title: {title}")
@@ -177,71 +255,49 @@ class SerpApiCitationChecker:
         """
         all_citations = []
         total_citations = 0
-        start = 0
 
         try:
-            while True:
-                params = {
-                    "engine": "google_scholar",
-                    "cites": article_id,
-                    "start": start,
-                    "num": 20,
-                    "api_key": self.api_key,
-                    "hl": "en",
-                }
-                data = self.make_api_request(params)
-
-                total_citations = int(data["search_information"]["total_results"])
+            params = {
+                "engine": "google_scholar",
+                "cites": article_id,
+                "start": 0,
+                "num": 20,
+                "api_key": self.api_key,
+                "hl": "en",
+            }
+            data = self.make_api_request(params)
+            # The total is read from the first page only and bounds the pagination
+            total_citations = int(data["search_information"]["total_results"])
+
+            for start in range(0, total_citations, 20):
+                if start > 0:
+                    params["start"] = start
+                    data = self.make_api_request(params)
                 citations = data.get("organic_results", [])
+                if not citations:
+                    break
+
+                page_citations = [extract_citation_info(citation) for citation in citations]
+                all_citations.extend(page_citations)
 
-                for citation in citations:
-                    citation_info = {
-                        "title": citation.get("title"),
-                        "result_id": citation.get("result_id"),
-                        "link": citation.get("link"),
-                        "authors": [],
-                        "cited_by": None,
-                    }
-
-                    # Handle authors
-                    publication_info = citation.get("publication_info", {})
-                    authors = publication_info.get("authors", [])
-                    for author in authors:
-                        author_info = {
-                            "name": author.get("name"),
-                            "author_id": author.get("author_id"),
-                        }
-                        citation_info["authors"].append(author_info)
-                    if len(authors) == 0:
+                for citation_info in page_citations:
+                    if not citation_info["authors"]:
                         self.save_exception(
                             "get_citations",
-                            citation.get("result_id"),
+                            citation_info["result_id"],
                             article_id,
                             "No authors found for citing article",
                         )
 
-                    # Handle cited_by
-                    inline_links = citation.get("inline_links", {})
-                    cited_by = inline_links.get("cited_by", {})
-                    if cited_by:
-                        citation_info["cited_by"] = cited_by.get("total")
-
-                    all_citations.append(citation_info)
-
                     # Log missing fields
                     missing_fields = [field for field, value in citation_info.items() if value is None]
                     if missing_fields:
                         self.save_exception(
                             "get_citations",
-                            citation.get("result_id"),
+                            citation_info["result_id"],
                             article_id,
                             f"Missing fields: {', '.join(missing_fields)}",
                         )
-
-                if len(all_citations) >= total_citations or len(citations) == 0:
-                    break
-
-                start += 20
         except Exception as e:
             logging.error(f"Error fetching citations for article ID '{article_id}':" f" {str(e)}")
             self.save_exception("get_citations", "", article_id, str(e))
@@ -283,13 +339,12 @@ class SerpApiCitationChecker:
             "citing_article_identifier": citing_article_identifier,
             "cited_article_identifier": cited_article_identifier,
             "reason": reason,
-            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()),
+            "timestamp": format_timestamp(int(time.time())),
         }
-        with open(os.path.join(self.output_dir, "serp_api_exceptions.json"), "a") as f:
-            json.dump(exception, f)
-            f.write("\n")
+        with self._lock:
+            self.exceptions_file.write(orjson.dumps(exception).decode() + "\n")
 
-    def process_row(self, row: Dict) -> Optional[Dict]:
+    def process_row(self, row: ArticleRow) -> Optional[Dict]:
         """
         Process a single row of article data.
 
@@ -300,8 +355,8 @@ class SerpApiCitationChecker:
 
         Args:
         ----
-        row : Dict
-            A dictionary representing a row of article data from the CSV file.
+        row : ArticleRow
+            A row of article data from the CSV file.
 
         Returns:
         -------
@@ -309,35 +364,105 @@ class SerpApiCitationChecker:
             A dictionary with the article's title, ID, total citations, and citation
             details if the article is a BBP and published; otherwise, None.
         """
-        if row.get("is_bbp") == "True" and row.get("is_published") == "True":
+        if row.is_bbp == "True" and row.is_published == "True":
             article_id = self.get_article_id(row)
             if article_id:
                 citations = self.get_citations(article_id)
                 return {
-                    "title": row["title"],
+                    "title": row.title,
                     "article_id": article_id,
                     "total_citations": citations["total_citations"],
                     "citations": citations["citations"],
                 }
             else:
-                logging.warning(f"No article ID found for title: {row['title']}")
+                logging.warning(f"No article ID found for title: {row.title}")
                 self.save_exception(
                     "get_article_id",
                     "",
-                    row["title"],
+                    row.title,
                     "No article ID returned.",
                 )
 
         return None
 
+    def input_signature(self) -> Dict:
+        """
+        Identify the input CSV file, so that a checkpoint is only resumed for the same input.
+
+        Returns:
+        -------
+        Dict
+            The absolute path ("input_file"), size ("input_size") and modification time
+            ("input_mtime") of the CSV file.
+        """
+        stat = os.stat(self.csv_file)
+        return {
+            "input_file": os.path.abspath(self.csv_file),
+            "input_size": stat.st_size,
+            "input_mtime": stat.st_mtime,
+        }
+
+    def load_checkpoint(self) -> Dict:
+        """
+        Load the checkpoint of a previous interrupted run if it exists.
+
+        Returns:
+        -------
+        Dict
+            The number of rows already processed ("row"), the requests made in the
+            current rate-limit window ("requests_in_window") and the start time of
+            that window ("window_start"). A fresh state is returned if there is no checkpoint.
+            If the checkpoint was saved for another input CSV file, or the file changed since,
+            its rows are not skipped; only the rate-limit window is kept, as it is per API key.
+        """
+        if not os.path.exists(self.checkpoint_file):
+            return {"row": 0, "requests_in_window": 0, "window_start": time.time()}
+        with open(self.checkpoint_file, "rb") as f:
+            checkpoint = orjson.loads(f.read())
+        signature = self.input_signature()
+        if any(checkpoint.get(key) != value for key, value in signature.items()):
+            logging.warning(
+                f"Ignoring the rows of checkpoint {self.checkpoint_file}: it was saved for another"
+                f" version of the input file or another input file ({checkpoint.get('input_file')})"
+            )
+            checkpoint["row"] = 0
+        return checkpoint
+
+    def save_checkpoint(self, row: int, window_start: float) -> None:
+        """
+        Atomically save the number of processed rows and the rate-limit window state.
+
+        Args:
+        ----
+        row : int
+            The number of CSV rows processed so far.
+        window_start : float
+            The time at which the current rate-limit window started.
+        """
+        checkpoint = {
+            "row": row,
+            "requests_in_window": self.requests_made,
+            "window_start": window_start,
+            **self.input_signature(),
+        }
+        tmp_file = self.checkpoint_file + ".tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(orjson.dumps(checkpoint))
+        os.replace(tmp_file, self.checkpoint_file)
+
     def process_csv(self):
         """
         Process the CSV file to fetch citations for articles.
 
         This function reads a CSV file containing article data, processes each row to
         check if the article is a BBP and published, retrieves the article ID, and
-        fetches its citations. The results are saved to a JSONL file in the specified
-        output directory.
+        fetches its citations. Rows are processed concurrently in batches of
+        `max_workers`, the shared rate limit of `make_api_request` still applies.
+        The results are saved to a JSONL file in the specified output directory.
+
+        A checkpoint is saved after every batch, so an interrupted run resumes
+        after the last processed row, appending to the existing results and
+        keeping track of the requests already spent in the current hour.
 
         Args:
         ----
@@ -346,29 +471,61 @@ class SerpApiCitationChecker:
         Returns:
         -------
         List[Dict]: A list of dictionaries, each containing the article's title, ID,
-                    total citations, and citation details.
+                    total citations, and citation details, for the rows processed in this run.
+
+        Raises:
+        ------
+        ValueError
+            If the CSV file is missing one of the `ArticleRow` columns.
         """
         results = []
 
         output_file = os.path.join(self.output_dir, "serp_citation_results.jsonl")
+        checkpoint = self.load_checkpoint()
+        rows_done = checkpoint["row"]
+        window_start = checkpoint["window_start"]
+        if time.time() - window_start < 3600:
+            self.requests_made = checkpoint["requests_in_window"]
+        else:
+            window_start = time.time()
+        if rows_done:
+            logging.info(f"Resuming from checkpoint after {rows_done} rows")
 
         with (
             open(self.csv_file, "r") as file,
-            open(output_file, "w") as outfile,
+            open(output_file, "ab" if rows_done else "wb", buffering=1 << 20) as outfile,
+            ThreadPoolExecutor(max_workers=self.max_workers) as executor,
         ):
-            reader = csv.DictReader(file)
-            for row in reader:
-                row_result = self.process_row(row)
-                if row_result:
-                    results.append(row_result)
-                    json.dump(row_result, outfile)
-                    outfile.write("\n")
+            reader = csv.reader(file)
+            # Resolve the column positions once instead of building a dict for every row
+            header = next(reader)
+            get_fields = itemgetter(*(header.index(field) for field in ArticleRow._fields))
+            rows = islice((ArticleRow._make(get_fields(row)) for row in reader if row), rows_done, None)
+            while batch := list(islice(rows, self.max_workers)):
+                # Only write once the whole batch is done, so the output never runs ahead of the checkpoint
+                batch_results = list(executor.map(self.process_row, batch))
+                for row_result in batch_results:
+                    if row_result:
+                        results.append(row_result)
+                        outfile.write(orjson.dumps(row_result, option=orjson.OPT_APPEND_NEWLINE))
+
+                # The results have to be on disk before the checkpoint points past them
+                rows_done += len(batch)
+                outfile.flush()
+                self.exceptions_file.flush()
+                self.save_checkpoint(rows_done, window_start)
 
                 if self.requests_made >= self.max_requests_per_hour:
-                    logging.info(f"Reached {self.max_requests_per_hour} requests." " Waiting for 1 hour...")
-                    time.sleep(3600)
+                    wait = max(0.0, 3600 - (time.time() - window_start))
+                    logging.info(f"Reached {self.max_requests_per_hour} requests." f" Waiting for {wait:.0f}s...")
+                    time.sleep(wait)
                     self.requests_made = 0
+                    window_start = time.time()
+                    self.save_checkpoint(rows_done, window_start)
 
+        # The run completed, the next one starts from scratch
+        if os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
         logging.info(f"Results saved to {output_file}")
         return results
 
@@ -393,6 +550,12 @@ def get_parser():
         default="output",
         help="Directory to save the output JSONL file.",
     )
+    parser.add_argument(
+        "--max_workers",
+        type=int,
+        default=16,
+        help="Number of articles to process concurrently.",
+    )
     return parser
 
 
@@ -418,8 +581,8 @@ def main():
     articles = args.articles_csv
     output_dir = args.output_dir
 
-    checker = SerpApiCitationChecker(api_key, articles, output_dir)
-    results = checker.process_csv()
+    with SerpApiCitationChecker(api_key, articles, output_dir, max_workers=args.max_workers) as checker:
+        results = checker.process_csv()
 
     logging.info(f"Processed {len(results)} articles")
     logging.info(f"Number of SERP_API requests made: {checker.requests_made}")
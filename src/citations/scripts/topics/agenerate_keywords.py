@@ -4,19 +4,30 @@ import argparse
 import asyncio
 import json
 import logging
+import math
 import os
-from typing import Dict, List
+import re
+from collections import Counter, defaultdict
+from typing import AsyncIterator, Dict, Iterable, List, Set, Tuple
 
+import numpy as np
+import orjson
 from dotenv import load_dotenv
-from langchain.chains import LLMChain
-from langchain.docstore.document import Document
+from langchain.globals import set_llm_cache
+from langchain_community.cache import SQLiteCache
+from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import PromptTemplate
 from langchain_openai import ChatOpenAI
-from neo4j import GraphDatabase
-from pydantic import SecretStr
+from neo4j import AsyncGraphDatabase, AsyncManagedTransaction
+from openai import AsyncOpenAI
+from pydantic import BaseModel, SecretStr, ValidationError
+from sklearn.cluster import AgglomerativeClustering, KMeans
 from tenacity import retry, stop_after_attempt, wait_random_exponential  # for exponential backoff
 
+from citations.embed import load_keyword_embeddings
+from citations.openai_batch import run_batch
 from citations.schemas import ClusterAnalysis
+from citations.utils import normalize_keyword
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
@@ -32,13 +43,33 @@ class Config:
     NEO4J_PASSWORD: str = os.getenv("NEO4J_PASSWORD", "password") or "password"
     OPENAI_API_KEY: SecretStr = SecretStr(os.getenv("OPENAI_API_KEY") or "your_default_api_key")
     DEFAULT_NUM_KEYWORDS: int = 3
+    DEFAULT_MAX_CONCURRENCY: int = 50
+    LLM_CACHE_PATH: str = "data/llm_cache.sqlite"
+    ARTICLE_KEYWORDS_PATH: str = "data/article_keywords.jsonl"
+    KEYWORD_MODEL: str = "gpt-4o-mini"
+    KEYWORD_BATCH_INPUT_PATH: str = "data/keyword_batch_input"
+    MERGE_SHARD_SIZE: int = 500
+    MERGE_MAX_CONCURRENCY: int = 10
+    MERGE_DISTANCE_THRESHOLD: float = 0.15
 
 
 config = Config()
 
+# One "N. merged_keyword: [kw_1, kw_2, ...]" suggestion per line of the LLM output.
+MERGE_SUGGESTION_PATTERN = re.compile(r"^\s*\d+\.\s*([^:\n]+):\s*\[([^\]\n]*)\]", re.MULTILINE)
+
 if config.OPENAI_API_KEY is None:
     raise ValueError("OPENAI_API_KEY must be set in the configuration.")
 
+# One driver for the whole run; its pool is shared by every session.
+driver = AsyncGraphDatabase.driver(
+    config.NEO4J_URI,
+    auth=(config.NEO4J_USER, config.NEO4J_PASSWORD),
+    max_connection_pool_size=64,
+    connection_acquisition_timeout=60,
+    fetch_size=10_000,
+)
+
 
 def parse_arguments():
     """Parse command line arguments."""
@@ -55,19 +86,64 @@ def parse_arguments():
         default=config.DEFAULT_NUM_KEYWORDS,
         help="Number of keywords to extract per article",
     )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=config.DEFAULT_MAX_CONCURRENCY,
+        help="Maximum number of concurrent keyword extraction requests (only with --online)",
+    )
+    parser.add_argument(
+        "--online",
+        action="store_true",
+        help=(
+            "Call the chat model directly instead of submitting an OpenAI batch; only these calls are cached in "
+            f"{config.LLM_CACHE_PATH}, batch requests are sent again on every run"
+        ),
+    )
     parser.add_argument(
         "--force-reextract",
         action="store_true",
-        help="Force re-extraction of keywords",
+        help="Force re-extraction of keywords (answered from the LLM cache only with --online)",
     )
     parser.add_argument(
         "--force-suggest",
         action="store_true",
         help="Force suggestions of merging keywords",
     )
+    parser.add_argument(
+        "--keyword-embeddings",
+        type=str,
+        help="JSONL file of keyword embeddings; if given, merges are suggested by clustering them instead of an LLM",
+    )
+    parser.add_argument(
+        "--llm-merges",
+        action="store_true",
+        help="Suggest merges with the LLM even with --keyword-embeddings, which then only group keywords into prompts",
+    )
+    parser.add_argument(
+        "--merge-distance-threshold",
+        type=float,
+        default=config.MERGE_DISTANCE_THRESHOLD,
+        help="Maximum cosine distance between keywords merged when using --keyword-embeddings",
+    )
     return parser.parse_args()
 
 
+class KeywordList(BaseModel):
+    """Structured output of the keyword extraction prompt."""
+
+    keywords: List[str]
+
+
+# Strict structured outputs require every property to be required and no additional properties
+KEYWORD_LIST_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {"keywords": {"type": "array", "items": {"type": "string"}}},
+    "required": ["keywords"],
+    "additionalProperties": False,
+}
+
+
 def load_clusters_from_json(json_path: str) -> Dict[int, List[str]]:
     """
     Load clusters from a JSON file.
@@ -95,35 +171,160 @@ def load_clusters_from_json(json_path: str) -> Dict[int, List[str]]:
         raise
 
 
-@retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6))
-async def extract_keywords_for_article(
-    text: str,
-    uid: str,
-    keyword_chain: LLMChain,
-    num_keywords: int,
-) -> Dict[str, List[str]]:
+def load_article_keywords(jsonl_path: str) -> Dict[str, List[str]]:
     """
-    Extract keywords from an article.
+    Load extracted keywords from a JSON Lines file.
 
     Parameters
     ----------
-    text
-        Text of the article.
-    uid
-        UID of the article.
-    keyword_chain
-        LLMChain for extracting keywords.
-    num_keywords
-        Number of keywords to extract.
+    jsonl_path
+        Path to JSONL file where each line maps one article UID to its keywords.
 
     Returns
     -------
     dict
         Dictionary with the UID of the article as the key and a list of keywords as the value.
+        When an article was re-extracted, the most recent line wins.
+    """
+    article_keywords: Dict[str, List[str]] = {}
+    if os.path.exists(jsonl_path):
+        with open(jsonl_path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    article_keywords.update(orjson.loads(line))
+    return article_keywords
+
+
+def load_completed_uids(jsonl_path: str) -> Set[str]:
+    """
+    Stream the UIDs of articles that already have keywords from a JSON Lines file.
+
+    Only the UIDs are kept, so the check costs memory proportional to the number of
+    articles rather than to the number of keywords.
+
+    Parameters
+    ----------
+    jsonl_path
+        Path to JSONL file where each line maps one article UID to its keywords.
+
+    Returns
+    -------
+    set
+        UIDs of the articles found in the file.
+    """
+    completed: Set[str] = set()
+    if os.path.exists(jsonl_path):
+        with open(jsonl_path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    completed.update(orjson.loads(line))
+    return completed
+
+
+async def fetch_article_texts(tx: AsyncManagedTransaction, uids: List[str]) -> List[Tuple[str, str]]:
+    """
+    Fetch the title and abstract of several articles in one query.
+
+    Parameters
+    ----------
+    tx
+        A Neo4j transaction object.
+    uids
+        UIDs of the articles.
+
+    Returns
+    -------
+    list
+        Pairs of article UID and the text (title followed by abstract) to extract keywords from.
+    """
+    result = await tx.run(
+        "UNWIND $uids AS uid MATCH (a:Article {uid: uid}) RETURN a.title + ' ' +"
+        " COALESCE(a.abstract, '') AS text, a.uid AS uid",
+        uids=uids,
+    )
+    return [(record["uid"], record["text"]) async for record in result]
+
+
+async def extract_keywords_online(
+    texts: List[Tuple[str, str]], keyword_template: str, max_concurrency: int
+) -> AsyncIterator[Tuple[str, List[str]]]:
+    """
+    Extract keywords by calling the chat model directly, yielding results as they complete.
+
+    Parameters
+    ----------
+    texts
+        Pairs of article UID and article text.
+    keyword_template
+        Prompt template with a ``{context}`` placeholder for the article text.
+    max_concurrency
+        Maximum number of concurrent requests.
+
+    Yields
+    ------
+    tuple
+        UID of the article and its extracted keywords.
+    """
+    llm = ChatOpenAI(
+        model=config.KEYWORD_MODEL,
+        temperature=0,
+        api_key=config.OPENAI_API_KEY,
+    )
+    keyword_prompt = PromptTemplate.from_template(keyword_template)
+    keyword_chain = (keyword_prompt | llm.with_structured_output(KeywordList)).with_retry(
+        wait_exponential_jitter=True, stop_after_attempt=6
+    )
+    inputs = [{"context": text} for _, text in texts]
+    async for index, output in keyword_chain.abatch_as_completed(
+        inputs, config={"max_concurrency": max_concurrency}, return_exceptions=True
+    ):
+        uid = texts[index][0]
+        if isinstance(output, Exception):
+            logger.error(f"Failed to extract keywords for article {uid}: {output}")
+            continue
+        yield uid, output.keywords
+
+
+async def extract_keywords_batch(
+    texts: List[Tuple[str, str]], keyword_template: str
+) -> AsyncIterator[Tuple[str, List[str]]]:
+    """
+    Extract keywords through the OpenAI Batch API.
+
+    Parameters
+    ----------
+    texts
+        Pairs of article UID and article text.
+    keyword_template
+        Prompt template with a ``{context}`` placeholder for the article text.
+
+    Yields
+    ------
+    tuple
+        UID of the article and its extracted keywords.
     """
-    document = Document(page_content=text)
-    keywords = (await keyword_chain.ainvoke(document)).get("text", "").strip().split(", ")
-    return {uid: keywords[:num_keywords]}
+    client = AsyncOpenAI(api_key=config.OPENAI_API_KEY.get_secret_value())
+    response_format = {
+        "type": "json_schema",
+        "json_schema": {"name": "keyword_list", "strict": True, "schema": KEYWORD_LIST_JSON_SCHEMA},
+    }
+    requests = {
+        uid: {
+            "model": config.KEYWORD_MODEL,
+            "temperature": 0,
+            "messages": [{"role": "user", "content": keyword_template.format(context=text)}],
+            "response_format": response_format,
+        }
+        for uid, text in texts
+    }
+    responses = await run_batch(client, requests, "/v1/chat/completions", config.KEYWORD_BATCH_INPUT_PATH)
+    for uid, body in responses.items():
+        try:
+            output = KeywordList.model_validate_json(body["choices"][0]["message"]["content"])
+        except (KeyError, IndexError, ValidationError) as e:
+            logger.error(f"Failed to parse keywords for article {uid}: {e}")
+            continue
+        yield uid, output.keywords
 
 
 async def extract_keywords(clusters: Dict[int, List[str]], num_keywords: int, args) -> Dict[str, List[str]]:
@@ -142,70 +343,43 @@ async def extract_keywords(clusters: Dict[int, List[str]], num_keywords: int, ar
     Returns
     -------
     dict
-        Dictionary with the UID of the article as the key and a list of keywords as the value.
+        Keywords extracted during this run, with the UID of the article as the key and a list of
+        keywords as the value. All results are also appended to the article keywords file.
     """
-    llm = ChatOpenAI(
-        model="gpt-4o-mini",
-        temperature=0,
-        api_key=config.OPENAI_API_KEY,
-    )
-    keyword_template = (
-        f"Extract exactly {num_keywords} keywords from the following text,"
-        " separated by commas:\n{context}\nKeywords:"
+    keyword_template = f"Extract exactly {num_keywords} keywords from the following text:\n{{context}}"
+
+    completed = set() if args.force_reextract else load_completed_uids(config.ARTICLE_KEYWORDS_PATH)
+    article_keywords: Dict[str, List[str]] = {}
+
+    uids = list(
+        dict.fromkeys(uid for article_uids in clusters.values() for uid in article_uids if uid not in completed)
     )
-    keyword_prompt = PromptTemplate.from_template(keyword_template)
-    keyword_chain = LLMChain(llm=llm, prompt=keyword_prompt)
-
-    article_keywords = {}
-    if os.path.exists("data/article_keywords.json"):
-        with open("data/article_keywords.json", "r") as f:
-            article_keywords = json.load(f)
-
-    driver = GraphDatabase.driver(config.NEO4J_URI, auth=(config.NEO4J_USER, config.NEO4J_PASSWORD))
-
-    async def process_cluster(cluster_id: int, article_uids: List[str]):
-        """
-        Process articles in a cluster.
-
-        Parameters
-        ----------
-        cluster_id
-            Cluster ID.
-        article_uids
-            List of article UIDs in the cluster.
-
-        Returns
-        -------
-        None
-        """
-        tasks = []
-        with driver.session() as session:
-            for uid in article_uids:
-                if uid in article_keywords and not args.force_reextract:
-                    continue
-                logger.info(f"Extracting keywords for article {uid}")
-                neo4j_result = session.run(
-                    "MATCH (a:Article {uid: $uid}) RETURN a.title + ' ' +"
-                    " COALESCE(a.abstract, '') AS text, a.uid AS uid",
-                    uid=uid,
-                )
-                record = neo4j_result.single()
-                if record:
-                    text, uid = record["text"], record["uid"]
-                    task = extract_keywords_for_article(text, uid, keyword_chain, num_keywords)
-                    tasks.append(task)
-
-        results = await asyncio.gather(*tasks)
-        for result in results:
-            article_keywords.update(result)
 
-    await asyncio.gather(*[process_cluster(cluster_id, article_uids) for cluster_id, article_uids in clusters.items()])
-    driver.close()
+    if not uids:
+        logger.info("Keywords already extracted for all articles")
+        return article_keywords
+
+    async with driver.session() as session:
+        texts = await session.execute_read(fetch_article_texts, uids)
+    if len(texts) < len(uids):
+        logger.warning(f"{len(uids) - len(texts)} articles were not found in Neo4j and are skipped")
+
+    logger.info(f"Extracting keywords for {len(texts)} articles")
+    with open(config.ARTICLE_KEYWORDS_PATH, "a") as output_file:
+        if args.online:
+            results = extract_keywords_online(texts, keyword_template, args.max_concurrency)
+        else:
+            results = extract_keywords_batch(texts, keyword_template)
+        async for uid, keywords in results:
+            result = {uid: keywords[:num_keywords]}
+            output_file.write(json.dumps(result) + "\n")
+            output_file.flush()
+            article_keywords.update(result)
 
     return article_keywords
 
 
-@retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6))
+@retry(sleep=asyncio.sleep, wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6))
 async def generate_merge_suggestions(keywords: List[str], llm: ChatOpenAI) -> List[Dict[str, List[str]]]:
     """
     Generate suggestions for merging similar keywords.
@@ -241,57 +415,240 @@ async def generate_merge_suggestions(keywords: List[str], llm: ChatOpenAI) -> Li
     Suggestions:
     """
     merge_prompt = PromptTemplate.from_template(merge_template)
-    merge_chain = LLMChain(llm=llm, prompt=merge_prompt)
+    merge_chain = merge_prompt | llm | StrOutputParser()
 
-    merge_suggestions = (
-        (await merge_chain.ainvoke({"keywords": ", ".join(keywords)})).get("text", "").strip().split("\n")
-    )
+    merge_suggestions = await merge_chain.ainvoke({"keywords": ", ".join(keywords)})
 
     suggestions = []
-    for suggestion in merge_suggestions:
-        if not suggestion.strip():
-            continue
-        parts = suggestion.split(": ")
-        if len(parts) != 2:
-            logger.warning(f"Unexpected format in suggestion: {suggestion}")
-            continue
-        merged_keyword = parts[0].split(". ")[-1].strip()
-        existing_keywords = [kw.strip() for kw in parts[1].strip("[]").split(",")]
-        suggestions.append({merged_keyword: existing_keywords})
+    for match in MERGE_SUGGESTION_PATTERN.finditer(merge_suggestions):
+        merged_keyword, existing_keywords = match.group(1).strip(), match.group(2)
+        suggestions.append({merged_keyword: [kw.strip() for kw in existing_keywords.split(",")]})
+    if not suggestions and merge_suggestions.strip():
+        logger.warning(f"No suggestion in the expected format: {merge_suggestions}")
+
+    return suggestions
+
+
+def group_keyword_shards(
+    keywords: Iterable[str], shard_size: int, embeddings_path: str | None = None
+) -> List[List[str]]:
+    """
+    Split keywords into shards of at most ``shard_size`` keywords, keeping related keywords together.
+
+    If ``embeddings_path`` is given, the embedded keywords are grouped by KMeans on their embeddings
+    with about ``shard_size`` keywords per cluster, and larger clusters are split. The remaining
+    keywords are sorted by their normalized form, so spelling and plural variants share a shard.
+
+    Parameters
+    ----------
+    keywords
+        Keywords to split.
+    shard_size
+        Maximum number of keywords in one shard.
+    embeddings_path
+        Path to the JSONL file of keyword embeddings written by keywords_embed_umap.py.
+
+    Returns
+    -------
+    list
+        The shards of keywords.
+    """
+    ordered = sorted(set(keywords), key=normalize_keyword)
+    groups: List[List[str]] = []
+    if embeddings_path is not None:
+        embedded_keywords, _, vectors = load_keyword_embeddings(embeddings_path)
+        # Embeddings are stored under the normalized keyword
+        rows = {keyword: i for i, keyword in enumerate(embedded_keywords)}
+        embedded = [keyword for keyword in ordered if normalize_keyword(keyword) in rows]
+        logger.info(f"Grouping {len(embedded)} embedded keywords out of {len(ordered)} by similarity")
+        if len(embedded) > shard_size:
+            labels = KMeans(
+                n_clusters=math.ceil(len(embedded) / shard_size), n_init="auto", random_state=0
+            ).fit_predict(vectors[[rows[normalize_keyword(keyword)] for keyword in embedded]])
+            clusters: Dict[int, List[str]] = defaultdict(list)
+            for keyword, label in zip(embedded, labels):
+                clusters[label].append(keyword)
+            groups.extend(clusters.values())
+        else:
+            groups.append(embedded)
+        embedded_set = set(embedded)
+        ordered = [keyword for keyword in ordered if keyword not in embedded_set]
+    groups.append(ordered)
+    return [group[i : i + shard_size] for group in groups for i in range(0, len(group), shard_size)]
+
+
+async def suggest_merges(
+    keywords: Iterable[str],
+    llm: ChatOpenAI,
+    shard_size: int = config.MERGE_SHARD_SIZE,
+    max_concurrency: int = config.MERGE_MAX_CONCURRENCY,
+    embeddings_path: str | None = None,
+) -> List[Dict[str, List[str]]]:
+    """
+    Generate merge suggestions over shards of the keywords concurrently.
+
+    Keywords are split by ``group_keyword_shards``, by embedding similarity if ``embeddings_path``
+    is given. When there is more than one shard, a reduce pass prompts the merged keywords of all
+    shards once more, so that groups from different shards that mean the same thing are combined.
+
+    Parameters
+    ----------
+    keywords
+        Keywords to look for merges in.
+    llm
+        ChatOpenAI instance.
+    shard_size
+        Maximum number of keywords sent in one prompt.
+    max_concurrency
+        Maximum number of prompts in flight at once.
+    embeddings_path
+        Path to the JSONL file of keyword embeddings used to group the shards.
+
+    Returns
+    -------
+    list
+        List of dictionaries with the merged keyword as the key and a list of existing keywords as the value.
+        Suggestions for the same merged keyword coming from different shards are combined.
+    """
+    shards = group_keyword_shards(keywords, shard_size, embeddings_path)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def suggest_for_shard(shard: List[str]) -> List[Dict[str, List[str]]]:
+        async with semaphore:
+            return await generate_merge_suggestions(shard, llm)
+
+    results = await asyncio.gather(*[suggest_for_shard(shard) for shard in shards])
+
+    merged: Dict[str, List[str]] = {}
+    for suggestions in results:
+        for suggestion in suggestions:
+            for merged_keyword, existing_keywords in suggestion.items():
+                merged[merged_keyword] = list(dict.fromkeys(merged.get(merged_keyword, []) + existing_keywords))
+
+    if len(shards) > 1 and len(merged) > 1:
+        # Reduce pass: suggest merges among the merged keywords themselves and combine their groups
+        names = sorted(merged, key=normalize_keyword)
+        reductions = await asyncio.gather(
+            *[suggest_for_shard(names[i : i + shard_size]) for i in range(0, len(names), shard_size)]
+        )
+        for suggestions in reductions:
+            for suggestion in suggestions:
+                for merged_keyword, merged_names in suggestion.items():
+                    found = [name for name in dict.fromkeys([merged_keyword, *merged_names]) if name in merged]
+                    if len(found) < 2:
+                        continue
+                    merged[merged_keyword] = list(
+                        dict.fromkeys(keyword for name in found for keyword in merged.pop(name))
+                    )
+    return [{merged_keyword: existing_keywords} for merged_keyword, existing_keywords in merged.items()]
+
+
+def suggest_merges_from_embeddings(
+    article_keywords: Dict[str, List[str]],
+    embeddings_path: str,
+    distance_threshold: float = config.MERGE_DISTANCE_THRESHOLD,
+) -> List[Dict[str, List[str]]]:
+    """
+    Suggest keyword merges by clustering keyword embeddings instead of prompting an LLM.
 
+    Keywords are grouped by average-linkage agglomerative clustering on cosine distance. Each
+    group with more than one keyword becomes a suggestion named after its most frequent keyword.
+
+    Parameters
+    ----------
+    article_keywords
+        Dictionary with the UID of the article as the key and a list of keywords as the value.
+    embeddings_path
+        Path to the JSONL file of keyword embeddings written by keywords_embed_umap.py.
+    distance_threshold
+        Maximum cosine distance between keyword groups that are still merged.
+
+    Returns
+    -------
+    list
+        List of dictionaries with the merged keyword as the key and a list of existing keywords as the value.
+        Keywords without an embedding are left out.
+    """
+    counts = Counter(keyword for keywords in article_keywords.values() for keyword in keywords)
+    embedded_keywords, _, vectors = load_keyword_embeddings(embeddings_path)
+    rows = {keyword: i for i, keyword in enumerate(embedded_keywords)}
+
+    # Embeddings are stored under the normalized keyword, so group the raw spellings first
+    variants: Dict[str, List[str]] = defaultdict(list)
+    for keyword in counts:
+        normalized = normalize_keyword(keyword)
+        if normalized in rows:
+            variants[normalized].append(keyword)
+    logger.info(f"Clustering {len(variants)} embedded keywords out of {len(counts)}")
+
+    names = list(variants)
+    if len(names) > 1:
+        labels = AgglomerativeClustering(
+            n_clusters=None,
+            metric="cosine",
+            linkage="average",
+            distance_threshold=distance_threshold,
+        ).fit_predict(vectors[[rows[name] for name in names]])
+    else:
+        labels = np.zeros(len(names), dtype=int)
+
+    groups: Dict[int, List[str]] = defaultdict(list)
+    for name, label in zip(names, labels):
+        groups[label].extend(variants[name])
+
+    suggestions = []
+    for members in groups.values():
+        if len(members) > 1:
+            merged_keyword = max(members, key=counts.__getitem__)
+            suggestions.append({merged_keyword: sorted(members)})
     return suggestions
 
 
 async def main():
     """Run main function."""
     args = parse_arguments()
+    # Cache LLM responses made through langchain on disk, keyed by the rendered prompt and model
+    # parameters, so re-runs only pay for prompts that actually changed (new text, template or
+    # number of keywords). This covers keyword extraction with --online and the merge suggestions;
+    # requests submitted through the Batch API, the default for keyword extraction, bypass it.
+    set_llm_cache(SQLiteCache(database_path=config.LLM_CACHE_PATH))
     all_clusters = load_clusters_from_json(args.json_path)
 
-    if os.path.exists("data/article_keywords.json"):
-        logger.info("Extracting Keywords from Articles")
-        article_keywords = await extract_keywords(all_clusters, args.num_keywords, args)
-        with open("data/article_keywords.json", "w") as f:
-            json.dump(article_keywords, f, indent=4)
-        logger.info("Article keywords saved to data/article_keywords.json")
+    logger.info("Extracting Keywords from Articles")
+    await extract_keywords(all_clusters, args.num_keywords, args)
+    logger.info(f"Article keywords saved to {config.ARTICLE_KEYWORDS_PATH}")
 
     if args.force_suggest or not os.path.exists("data/keyword_merge_suggestions.jsonl"):
-        with open("data/article_keywords.json", "r") as f:
-            article_keywords = json.load(f)
+        article_keywords = load_article_keywords(config.ARTICLE_KEYWORDS_PATH)
         logger.info("Generating suggestions for merging similar keywords.")
-        all_keywords = {keyword for keywords in article_keywords.values() for keyword in keywords}
-        merge_suggestions = await generate_merge_suggestions(
-            all_keywords,
-            ChatOpenAI(
-                model="gpt-4o-mini",
-                temperature=0,
-                openai_api_key=config.OPENAI_API_KEY,
-            ),
-        )
+        if args.keyword_embeddings and not args.llm_merges:
+            merge_suggestions = suggest_merges_from_embeddings(
+                article_keywords, args.keyword_embeddings, args.merge_distance_threshold
+            )
+        else:
+            all_keywords = {keyword for keywords in article_keywords.values() for keyword in keywords}
+            merge_suggestions = await suggest_merges(
+                all_keywords,
+                ChatOpenAI(
+                    model="gpt-4o-mini",
+                    temperature=0,
+                    openai_api_key=config.OPENAI_API_KEY,
+                ),
+                embeddings_path=args.keyword_embeddings,
+            )
         with open("data/keyword_merge_suggestions.jsonl", "w") as f:
             for suggestion in merge_suggestions:
                 f.write(json.dumps(suggestion) + "\n")
         logger.info("Suggestions saved to data/keyword_merge_suggestions.jsonl")
 
 
+async def run():
+    """Run main function and close the Neo4j driver on the same event loop."""
+    try:
+        await main()
+    finally:
+        await driver.close()
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(run())
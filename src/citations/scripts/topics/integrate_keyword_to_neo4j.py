@@ -3,16 +3,22 @@
 import argparse
 import json
 import logging
-from typing import Dict, List
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List
 
 from dotenv import load_dotenv
 from neo4j import Driver, GraphDatabase
 
-from citations.neo4j.loader import execute_query_with_logging
+from citations.neo4j.loader import create_keyword_schema
+from citations.neo4j.utils import write_in_chunks
+from citations.utils import normalize_keyword
 
 logging.basicConfig(level=logging.INFO)
 load_dotenv()
 
+# Rows sent per UNWIND query; each chunk is committed as one transaction.
+CHUNK_SIZE = 10_000
+
 
 def parse_arguments():
     """Parse command line arguments."""
@@ -69,41 +75,58 @@ def update_neo4j(
     embeddings: Dict[str, List[float]],
     umap_coordinates: Dict[str, List[float]],
     article_keywords: Dict[str, List[str]],
+    chunk_size: int = CHUNK_SIZE,
 ):
     """Update Neo4j database with keywords, embeddings, and UMAP coordinates."""
     with driver.session() as session:
-        # First, create or update Keyword nodes
+        session.execute_write(create_keyword_schema)
+
+        # Inverted index of the normalized keywords actually linked to an article
+        keyword_to_articles: Dict[str, List[str]] = defaultdict(list)
         for article_id, keywords in article_keywords.items():
-            for keyword in keywords:
-                query = """
-                MERGE (k:Keyword {name: $keyword})
-                WITH k
-                MATCH (a:Article {uid: $article_id})
-                MERGE (a)-[:HAS_KEYWORD]->(k)
-                """
-                execute_query_with_logging(
-                    session,
-                    query,
-                    {"keyword": keyword, "article_id": article_id},
-                )
+            for keyword in dict.fromkeys(map(normalize_keyword, keywords)):
+                keyword_to_articles[keyword].append(article_id)
+
+        # First, create or update Keyword nodes, merging each keyword once
+        query = """
+        UNWIND $rows AS row
+        MERGE (k:Keyword {name: row.keyword})
+        WITH k, row
+        UNWIND row.article_ids AS article_id
+        MATCH (a:Article {uid: article_id})
+        MERGE (a)-[:HAS_KEYWORD]->(k)
+        """
+        rows: Iterable[Dict[str, Any]] = (
+            {"keyword": keyword, "article_ids": article_ids} for keyword, article_ids in keyword_to_articles.items()
+        )
+        write_in_chunks(session, query, rows, chunk_size)
 
         logging.info("Keyword nodes created and linked to articles.")
 
-        # Then, update embeddings and UMAP coordinates
-        for keyword, embedding in embeddings.items():
-            query = """
-            MATCH (k:Keyword {name: $keyword})
-            SET k.embedding = $embedding
-            """
-            execute_query_with_logging(session, query, {"keyword": keyword, "embedding": embedding})
-
-        for keyword, coordinates in umap_coordinates.items():
-            x, y = coordinates[0], coordinates[1]
-            query = """
-            MATCH (k:Keyword {name: $keyword})
-            SET k.umap_x = $x, k.umap_y = $y
-            """
-            execute_query_with_logging(session, query, {"keyword": keyword, "x": x, "y": y})
+        # Then, update embeddings and UMAP coordinates, skipping keywords that have no node
+        query = """
+        UNWIND $rows AS row
+        MATCH (k:Keyword {name: row.keyword})
+        SET k.embedding = row.embedding
+        """
+        rows = (
+            {"keyword": keyword, "embedding": embedding}
+            for keyword, embedding in zip(map(normalize_keyword, embeddings), embeddings.values())
+            if keyword in keyword_to_articles
+        )
+        write_in_chunks(session, query, rows, chunk_size)
+
+        query = """
+        UNWIND $rows AS row
+        MATCH (k:Keyword {name: row.keyword})
+        SET k.umap_x = row.x, k.umap_y = row.y
+        """
+        rows = (
+            {"keyword": keyword, "x": coordinates[0], "y": coordinates[1]}
+            for keyword, coordinates in zip(map(normalize_keyword, umap_coordinates), umap_coordinates.values())
+            if keyword in keyword_to_articles
+        )
+        write_in_chunks(session, query, rows, chunk_size)
 
         logging.info("Keyword embeddings and UMAP coordinates updated.")
 
@@ -112,7 +135,13 @@ def main():
     """Load keywords, embeddings, and UMAP coordinates to Neo4j."""
     args = parse_arguments()
 
-    driver = GraphDatabase.driver(args.neo4j_uri, auth=(args.neo4j_user, args.neo4j_password))
+    # A single driver is shared by every chunk; the URI comes from the CLI, so it is built here.
+    driver = GraphDatabase.driver(
+        args.neo4j_uri,
+        auth=(args.neo4j_user, args.neo4j_password),
+        max_connection_pool_size=64,
+        connection_acquisition_timeout=60,
+    )
 
     embeddings = load_embeddings(args.embeddings_file)
     umap_coordinates = load_umap_coordinates(args.umap_file)
@@ -2,17 +2,24 @@
 
 import argparse
 import asyncio
+import hashlib
 import json
 import logging
 import os
 from typing import Any, Dict, List
 
+import numpy as np
+import orjson
 import umap
 from dotenv import load_dotenv
 from openai import AsyncOpenAI
 from tenacity import retry, stop_after_attempt, wait_random_exponential
 from tqdm.asyncio import tqdm
 
+from citations.embed import load_keyword_embeddings
+from citations.openai_batch import run_batch
+from citations.utils import normalize_keyword
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -25,70 +32,130 @@ client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY", ""))
 
 
 @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6))
-async def fetch_embeddings(text: str, model: str) -> List[float] | None:
-    """Fetch embeddings for a given text using OpenAI API with exponential backoff."""
+async def fetch_embeddings(texts: List[str], model: str) -> List[List[float]]:
+    """Fetch embeddings for a batch of texts using OpenAI API with exponential backoff."""
     try:
-        response = await client.embeddings.create(input=text, model=model)
-        return response.data[0].embedding
+        response = await client.embeddings.create(input=texts, model=model)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
     except Exception as e:
         logger.error(f"Failed to get embeddings: {str(e)}")
         raise
 
 
-async def embed_keywords(keywords: List[str], model: str, batch_size: int = 10) -> List[Dict[str, Any]]:
-    """Embed keywords using OpenAI API."""
+async def embed_keywords(
+    keywords: List[str], model: str, batch_size: int = 512, max_concurrency: int = 20
+) -> List[Dict[str, Any]]:
+    """Embed keywords using OpenAI API, sending ``batch_size`` keywords per request."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def embed_batch(batch: List[str]) -> List[List[float]]:
+        async with semaphore:
+            return await fetch_embeddings(batch, model)
+
+    batches = [keywords[i : i + batch_size] for i in range(0, len(keywords), batch_size)]
+    batch_results = await tqdm.gather(*[embed_batch(batch) for batch in batches], desc="Processing keyword batches")
+
     all_embeddings = []
-    tasks = [fetch_embeddings(keyword, model) for keyword in keywords]
-    for i in tqdm(range(0, len(tasks), batch_size), desc="Processing keyword batches"):
-        batch_results = await asyncio.gather(*tasks[i : i + batch_size])
-        for j, emb in enumerate(batch_results):
-            if emb:
-                all_embeddings.append(
-                    {
-                        "keyword": keywords[i + j],
-                        "model": model,
-                        "vector": emb,
-                    }
-                )
+    for batch, embeddings in zip(batches, batch_results):
+        for keyword, emb in zip(batch, embeddings):
+            all_embeddings.append(
+                {
+                    "keyword": keyword,
+                    "model": model,
+                    "vector": emb,
+                }
+            )
     return all_embeddings
 
 
+async def embed_keywords_batch(
+    keywords: List[str], model: str, input_path: str, batch_size: int = 512
+) -> List[Dict[str, Any]]:
+    """Embed keywords through the OpenAI Batch API, ``batch_size`` keywords per request."""
+    batches = [keywords[i : i + batch_size] for i in range(0, len(keywords), batch_size)]
+    requests = {str(i): {"model": model, "input": batch} for i, batch in enumerate(batches)}
+    responses = await run_batch(client, requests, "/v1/embeddings", input_path)
+
+    all_embeddings = []
+    for i, batch in enumerate(batches):
+        if str(i) not in responses:
+            continue
+        data = sorted(responses[str(i)]["data"], key=lambda item: item["index"])
+        for keyword, item in zip(batch, data):
+            all_embeddings.append(
+                {
+                    "keyword": keyword,
+                    "model": model,
+                    "vector": item["embedding"],
+                }
+            )
+    return all_embeddings
+
+
+def l2_normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize the rows of a float matrix in place and return it."""
+    # einsum computes the row norms in a single pass without an (N, D) temporary of squares
+    norms = np.sqrt(np.einsum("ij,ij->i", matrix, matrix))[:, np.newaxis]
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
 def perform_umap(
-    embeddings: List[List[float]],
+    embeddings: np.ndarray | List[List[float]],
     n_neighbors: int = 15,
     n_components: int = 2,
-    metric: str = "euclidean",
+    metric: str = "cosine",
     min_dist: float = 0.1,
     random_state: int = 42,
+    init: str = "pca",
+    low_memory: bool = True,
+    cache_dir: str | None = None,
 ):
-    """Perform UMAP dimensionality reduction on the embeddings."""
+    """
+    Perform UMAP dimensionality reduction on the embeddings.
+
+    If ``cache_dir`` is given, the reduced embeddings are stored there as ``umap_<hash>.npy``,
+    where the hash covers the embedding matrix and the reducer parameters, and reused on later
+    runs with identical inputs instead of refitting.
+
+    Embeddings are reduced as an L2-normalised float32 matrix; OpenAI embeddings are unit
+    length, so cosine is the natural metric and float32 halves the memory of the KNN stage.
+    """
     reducer = umap.UMAP(
         n_neighbors=n_neighbors,
         n_components=n_components,
         metric=metric,
         min_dist=min_dist,
         random_state=random_state,
+        init=init,
+        low_memory=low_memory,
     )
-    reduced_embeddings = reducer.fit_transform(embeddings)
-    return reduced_embeddings, reducer.get_params()
+    params = reducer.get_params()
+    # Copy, as asarray would return a float32 input unchanged and it is then normalised in place
+    matrix = l2_normalize_rows(np.array(embeddings, dtype=np.float32, copy=True))
+    if cache_dir is None:
+        return reducer.fit_transform(matrix), params
 
+    digest = hashlib.sha256(matrix.tobytes())
+    digest.update(str(matrix.shape).encode())
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+    cache_file = os.path.join(cache_dir, f"umap_{digest.hexdigest()}.npy")
+    if os.path.exists(cache_file):
+        logger.info(f"Loading cached UMAP results from {cache_file}")
+        return np.load(cache_file), params
 
-def load_existing_embeddings(file_path: str) -> Dict[str, Dict[str, Any]]:
-    """Load existing embeddings from a JSONL file."""
-    existing_embeddings = {}
-    if os.path.exists(file_path):
-        with open(file_path, "r") as f:
-            for line in f:
-                data = json.loads(line)
-                existing_embeddings[data["keyword"]] = data
-    return existing_embeddings
+    reduced_embeddings = reducer.fit_transform(matrix)
+    np.save(cache_file, reduced_embeddings)
+    return reduced_embeddings, params
 
 
 async def main(
     data_dir: str,
     model: str = "text-embedding-3-large",
-    batch_size: int = 10,
+    batch_size: int = 512,
     n_keywords: int = 10,
+    max_concurrency: int = 20,
+    online: bool = False,
 ):
     """Run code to embed keywords using OpenAI API and perform UMAP."""
     # Path to data directory and files
@@ -101,7 +168,7 @@ async def main(
         keywords_dict = json.load(f)
 
     # Extract unique keywords
-    unique_keywords = list({kw for kws in keywords_dict.values() for kw in kws})
+    unique_keywords = sorted({normalize_keyword(kw) for kws in keywords_dict.values() for kw in kws})
     logger.info(f"Found {len(unique_keywords)} unique keywords.")
 
     # Take only the first n_keywords
@@ -110,49 +177,63 @@ async def main(
         logger.info(f"Using {len(unique_keywords)} keywords for embedding.")
 
     # Load existing embeddings
-    existing_embeddings = load_existing_embeddings(keywords_embedded_file)
+    existing_keywords, existing_models, existing_vectors = load_keyword_embeddings(keywords_embedded_file)
     # check if existing embeddings is not empty
-    if existing_embeddings != {}:
-        if any(item["model"] != model for item in existing_embeddings.values()):
+    if existing_keywords:
+        if any(item != model for item in existing_models):
             logger.warning("Existing embeddings are for a different model.")
-            existing_embeddings = {}
+            existing_keywords, existing_vectors = [], np.empty((0, 0), dtype=np.float32)
         else:
-            logger.info(f"Loaded {len(existing_embeddings)} existing embeddings.")
+            logger.info(f"Loaded {len(existing_keywords)} existing embeddings.")
     else:
         logger.info("No existing embeddings found.")
 
     # Identify new keywords that need embedding
-    new_keywords = [
-        kw for kw in unique_keywords if kw not in existing_embeddings or existing_embeddings[kw]["model"] != model
-    ]
+    embedded = set(existing_keywords)
+    new_keywords = [kw for kw in unique_keywords if kw not in embedded]
     logger.info(f"Found {len(new_keywords)} new keywords to embed.")
 
+    all_keywords = existing_keywords
+    embeddings = existing_vectors
+    new_embeddings: List[Dict[str, Any]] = []
     if new_keywords:
         # Embed new keywords
-        new_embeddings = await embed_keywords(new_keywords, model, batch_size)
+        if online:
+            new_embeddings = await embed_keywords(new_keywords, model, batch_size, max_concurrency)
+        else:
+            batch_input_path = os.path.join(data_dir, "keywords_embedding_batch_input")
+            new_embeddings = await embed_keywords_batch(new_keywords, model, batch_input_path, batch_size)
+
+    if new_keywords and new_embeddings:
+        # Existing lines are still valid, so only append the new ones unless the file is being replaced
+        mode = "ab" if existing_keywords else "wb"
+        with open(keywords_embedded_file, mode) as f:
+            for item in new_embeddings:
+                f.write(orjson.dumps(item, option=orjson.OPT_APPEND_NEWLINE))
 
         # Combine new and existing embeddings
-        all_embeddings = list(existing_embeddings.values()) + new_embeddings
-        # Save all keyword embeddings
-        with open(keywords_embedded_file, "w") as f:
-            for item in all_embeddings:
-                json.dump(item, f)
-                f.write("\n")
+        all_keywords = existing_keywords + [item["keyword"] for item in new_embeddings]
+        new_vectors = np.asarray([item["vector"] for item in new_embeddings], dtype=np.float32)
+        embeddings = np.vstack([existing_vectors, new_vectors]) if existing_keywords else new_vectors
 
         logger.info(f"All keyword embeddings saved as {keywords_embedded_file}")
+    elif new_keywords:
+        logger.warning("No embeddings were returned for the new keywords.")
     else:
-        all_embeddings = list(existing_embeddings.values())
         logger.info("No new keywords to embed.")
 
+    if not all_keywords:
+        logger.warning("No keyword embeddings to reduce, skipping UMAP.")
+        return
+
     # Perform UMAP
-    embeddings = [item["vector"] for item in all_embeddings]
-    reduced_embeddings, umap_params = perform_umap(embeddings)
+    reduced_embeddings, umap_params = perform_umap(embeddings, cache_dir=data_dir)
 
     # Save UMAP results
     umap_results = {
         "method": "UMAP",
         "params": umap_params,
-        "keywords": [item["keyword"] for item in all_embeddings],
+        "keywords": all_keywords,
         "reduced_dimensions": reduced_embeddings.tolist(),
     }
     with open(keywords_umap_file, "w") as f:
@@ -177,8 +258,19 @@ def parse_arguments():
     parser.add_argument(
         "--batch-size",
         type=int,
-        default=10,
-        help="Batch size for embedding requests.",
+        default=512,
+        help="Number of keywords sent per embedding request (the API accepts up to 2048).",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=20,
+        help="Maximum number of concurrent embedding requests (only with --online).",
+    )
+    parser.add_argument(
+        "--online",
+        action="store_true",
+        help="Call the embeddings endpoint directly instead of submitting an OpenAI batch.",
     )
     parser.add_argument(
         "--n-keywords",
@@ -191,4 +283,13 @@ def parse_arguments():
 
 if __name__ == "__main__":
     args = parse_arguments()
-    asyncio.run(main(args.data_dir, args.model, args.batch_size, args.n_keywords))
+    asyncio.run(
+        main(
+            args.data_dir,
+            args.model,
+            args.batch_size,
+            args.n_keywords,
+            args.max_concurrency,
+            args.online,
+        )
+    )
@@ -1,18 +1,28 @@
 """Process keywords and extract topics from clusters."""
 
 import argparse
-import json
+import asyncio
 import logging
 import os
-from typing import Dict, List
+from collections import Counter
+from itertools import chain
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Tuple
 
+import orjson
 from dotenv import load_dotenv
-from langchain.chains import LLMChain
+from langchain.globals import set_llm_cache
+from langchain_community.cache import SQLiteCache
+from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import PromptTemplate
 from langchain_openai import ChatOpenAI
-from neo4j import GraphDatabase
+from neo4j import AsyncDriver, AsyncGraphDatabase
 from pydantic import SecretStr
 
+from citations.neo4j.loader import acreate_keyword_schema
+from citations.neo4j.utils import awrite_in_chunks
+from citations.utils import normalize_keyword
+
 logging.basicConfig(level=logging.INFO)
 load_dotenv()
 
@@ -30,11 +40,12 @@ def parse_arguments():
     parser.add_argument("--neo4j-uri", default="bolt://localhost:7687", help="Neo4j URI")
     parser.add_argument("--neo4j-user", default="neo4j", help="Neo4j username")
     parser.add_argument("--neo4j-password", default="password", help="Neo4j password")
+    parser.add_argument("--neo4j-database", default="neo4j", help="Neo4j database")
     parser.add_argument(
         "--article-keywords",
         type=str,
         required=True,
-        help="Path to article keywords JSON file",
+        help="Path to article keywords JSON or JSONL file",
     )
     parser.add_argument(
         "--merge-suggestions",
@@ -77,25 +88,20 @@ def load_merge_suggestions(file_path: str) -> Dict[str, List[str]]:
     """
     merge_suggestions = {}
     if file_path and os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-        with open(file_path, "r") as f:
-            for line in f:
-                suggestion = json.loads(line)
-                merge_suggestions.update(suggestion)
+        for line in Path(file_path).read_bytes().splitlines():
+            if line.strip():
+                merge_suggestions.update(orjson.loads(line))
     return merge_suggestions
 
 
-args = parse_arguments()
-
-NEO4J_URI = args.neo4j_uri
-NEO4J_USER = args.neo4j_user
-NEO4J_PASSWORD = args.neo4j_password
-
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-if OPENAI_API_KEY is None:
-    raise ValueError("OPENAI_API_KEY must be set in the environment.")
-
-driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+LLM_CACHE_PATH = "data/llm_cache.sqlite"
+# Maximum number of keywords included in a cluster topic prompt
+MAX_TOPIC_KEYWORDS = 200
+# Clusters with at most this many keywords get a templated summary instead of an LLM call
+MAX_TEMPLATED_TOPIC_KEYWORDS = 3
+CLUSTER_RESULTS_PATH = "data/cluster_results.jsonl"
 
 
 def apply_merge_suggestions(
@@ -105,7 +111,7 @@ def apply_merge_suggestions(
     """
     Apply keyword merge suggestions to the article keywords.
 
-    Use a dictionary comprehension and set intersection for better performance and scalability.
+    Keywords are deduplicated per article, keeping their first occurrence order.
 
     Parameters
     ----------
@@ -130,16 +136,25 @@ def apply_merge_suggestions(
         for original_keyword in original_keywords
     }
 
-    # Update article keywords using dictionary comprehension and set intersection
+    # Most articles have no keyword to remap: isdisjoint checks that in C and skips the per-keyword lookups
+    remapped = merged_keywords.keys()
     updated_article_keywords = {
-        article_id: list({merged_keywords.get(keyword, keyword) for keyword in keywords})
+        article_id: list(
+            dict.fromkeys(
+                keywords
+                if remapped.isdisjoint(keywords)
+                else (merged_keywords.get(keyword, keyword) for keyword in keywords)
+            )
+        )
         for article_id, keywords in article_keywords.items()
     }
 
     return updated_article_keywords
 
 
-def extract_topics(clusters: Dict[int, List[str]], article_keywords: Dict[str, List[str]]) -> Dict[int, Dict]:
+async def extract_topics(
+    clusters: Dict[int, List[str]], article_keywords: Dict[str, List[str]], max_concurrency: int = 20
+) -> AsyncIterator[Tuple[int, Dict]]:
     """
     Extract topics from clusters using the article keywords.
 
@@ -149,52 +164,99 @@ def extract_topics(clusters: Dict[int, List[str]], article_keywords: Dict[str, L
         Dictionary of clusters where the key is the cluster ID and the value is the list of article UIDs.
     article_keywords : dict
         Dictionary of article keywords where the key is the article UID and the value is the list of keywords.
+    max_concurrency : int
+        Maximum number of topic summaries requested at the same time.
 
-    Returns
-    -------
-    dict
-        Dictionary of cluster topics where the key is the cluster ID and the value is a dictionary with the keywords and topic summary.
+    Yields
+    ------
+    tuple
+        Cluster ID and a dictionary with the keywords and topic summary, as soon as each summary is ready.
     """
     api_key = SecretStr(OPENAI_API_KEY) if OPENAI_API_KEY else None
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0, api_key=api_key)
+    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0, seed=0, api_key=api_key)
 
-    topic_template = """Based on the following keywords extracted from multiple research articles:
+    # The instructions come first so that every prompt shares the same cacheable prefix
+    topic_template = """Provide a brief summary (2-3 sentences) of the main research topic or theme represented by the following keywords extracted from multiple research articles.
 
-    {context}
+    Keywords: {context}
 
-    Provide a brief summary (2-3 sentences) of the main research topic or theme these keywords from these articles represent:
     Summary:"""
     topic_prompt = PromptTemplate.from_template(topic_template)
-    topic_chain = LLMChain(llm=llm, prompt=topic_prompt)
+    topic_chain = topic_prompt | llm | StrOutputParser()
 
-    results = {}
-    for cluster_id, article_uids in clusters.items():
-        cluster_keywords = set()
-        for uid in article_uids:
-            cluster_keywords.update(article_keywords.get(uid, []))
+    # Normalize each article's keywords once; the sets are then only counted per cluster
+    article_keyword_sets = {
+        uid: frozenset(map(normalize_keyword, keywords)) for uid, keywords in article_keywords.items()
+    }
 
-        all_keywords = ", ".join(cluster_keywords)
-        topic_summary = topic_chain.invoke({"context": all_keywords}).get("text", "").strip()
+    cluster_keywords: Dict[int, List[str]] = {}
+    # Clusters rendering the same prompt share a single LLM call
+    context_clusters: Dict[str, List[int]] = {}
+    for cluster_id, article_uids in clusters.items():
+        # Counter consumes the flattened sets in C; each count is the number of articles with the keyword
+        keyword_counts = Counter(
+            chain.from_iterable(article_keyword_sets.get(uid, frozenset()) for uid in article_uids)
+        )
+        # Sorted so that the same keyword set always renders the same prompt and hits the LLM cache
+        keywords = cluster_keywords[cluster_id] = sorted(keyword_counts)
+        if 0 < len(keywords) <= MAX_TEMPLATED_TOPIC_KEYWORDS:
+            # A summary of a handful of keywords would only restate them
+            yield cluster_id, {"keywords": keywords, "topic_summary": f"Research related to {', '.join(keywords)}."}
+            continue
+        # Only the keywords shared by most articles go into the prompt, ties broken alphabetically
+        top_keywords = sorted(keyword_counts, key=lambda keyword: (-keyword_counts[keyword], keyword))
+        context = ", ".join(sorted(top_keywords[:MAX_TOPIC_KEYWORDS]))
+        context_clusters.setdefault(context, []).append(cluster_id)
+
+    contexts = list(context_clusters)
+    # abatch_as_completed yields each summary as soon as it arrives while keeping max_concurrency requests in flight
+    async for index, topic_summary in topic_chain.abatch_as_completed(
+        [{"context": context} for context in contexts], config={"max_concurrency": max_concurrency}
+    ):
+        for cluster_id in context_clusters[contexts[index]]:
+            yield cluster_id, {"keywords": cluster_keywords[cluster_id], "topic_summary": topic_summary.strip()}
+
+
+def load_cluster_results(file_path: str) -> Dict[str, Dict]:
+    """
+    Load cluster topics from a JSONL file.
 
-        results[cluster_id] = {
-            "keywords": list(cluster_keywords),
-            "topic_summary": topic_summary,
-        }
+    Parameters
+    ----------
+    file_path : str
+        Path to the JSONL file with one cluster per line.
 
-    return results
+    Returns
+    -------
+    dict
+        Dictionary of cluster topics where the key is the cluster ID and the value is a dictionary with the keywords and topic summary.
+    """
+    cluster_results = {}
+    if os.path.exists(file_path):
+        for line in Path(file_path).read_bytes().splitlines():
+            if line.strip():
+                record = orjson.loads(line)
+                cluster_results[str(record.pop("cluster_id"))] = record
+    return cluster_results
 
 
-def update_neo4j(
+async def update_neo4j(
+    driver: AsyncDriver,
     article_keywords: Dict[str, List[str]],
-    cluster_results: Dict[int, Dict],
+    cluster_results: Dict[str, Dict],
     clusters: Dict[int, List[str]],
     clustering_algorithm: str,
+    database: str | None = None,
+    chunk_size: int = 10_000,
+    max_concurrency: int = 10,
 ):
     """
     Update Neo4j database with article keywords and cluster topics.
 
     Parameters
     ----------
+    driver : AsyncDriver
+        Neo4j driver; its connection pool is shared by the concurrent chunk writers.
     article_keywords : dict
         Dictionary of article keywords where the key is the article UID and the value is the list of keywords.
     cluster_results : dict
@@ -203,6 +265,12 @@ def update_neo4j(
         Dictionary of clusters where the key is the cluster ID and the value is the list of article UIDs.
     clustering_algorithm : str
         Clustering algorithm used to generate the clusters.
+    database : str | None
+        Neo4j database to write to; the server default database when None.
+    chunk_size : int
+        Number of rows written per UNWIND query and transaction.
+    max_concurrency : int
+        Number of cluster chunks written concurrently; keyword and article chunks are written one at a time.
 
     Returns
     -------
@@ -211,85 +279,110 @@ def update_neo4j(
     # convert clustering_algorithm AgglomerativeClustering to AGGLOMERATIVE
     clustering_algorithm = clustering_algorithm.split("Clustering")[0].upper()
 
-    with driver.session() as session:
-        # Delete existing Keyword and Topic nodes and their relationships
-        session.run(
-            """
-            MATCH (k:Keyword)
-            DETACH DELETE k
-            """
-        )
-        session.run(
-            """
-            MATCH (t:Topic)
-            DETACH DELETE t
-            """
-        )
-        logging.info("Existing Keyword and Topic nodes and their relationships deleted.")
+    async with driver.session(database=database) as session:
+        await session.execute_write(acreate_keyword_schema)
 
-        # Delete existing topic_summary and keywords properties on Cluster nodes
-        session.run(
+        # Delete existing Keyword and Topic nodes with their relationships, and the topic_summary and
+        # keywords properties of Cluster nodes. CALL ... IN TRANSACTIONS commits every chunk_size rows,
+        # which keeps memory bounded on large graphs; it needs an auto-commit transaction (session.run).
+        cleanup_queries = [
             """
-            MATCH (c:Cluster)
-            REMOVE c.topic_summary, c.keywords
+            MATCH (n)
+            WHERE n:Keyword OR n:Topic
+            CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF $chunk_size ROWS
+            """,
             """
-        )
-        logging.info("Existing topic_summary and keywords properties removed from" " Cluster nodes.")
-
-        # Update article keywords
-        for article_id, keywords in article_keywords.items():
-
-            # Create new Keyword nodes and relationships
-            for keyword in keywords:
-                session.run(
-                    """
-                    MERGE (k:Keyword {name: $keyword})
-                    WITH k
-                    MATCH (a:Article {uid: $article_id})
-                    MERGE (a)-[:HAS_KEYWORD]->(k)
-                    """,
-                    article_id=article_id,
-                    keyword=keyword,
-                )
-
-            # Update keywords property on Article node
-            session.run(
-                """
-                MATCH (a:Article {uid: $article_id})
-                SET a.keywords = $keywords
-                """,
-                article_id=article_id,
-                keywords=keywords,
-            )
-        logging.info("Article keywords updated in Neo4j.")
-
-        # Update cluster topics
-        for cluster_id, data in cluster_results.items():
-            topic_summary = data["topic_summary"]
-            keywords = data["keywords"]
-            # Set topic summary and keywords in Cluster node using the algorithm
-            session.run(
-                """
-                MATCH (c:Cluster {cluster_id: $cluster_id, algorithm: $clustering_algorithm})
-                SET c.topic_summary = $topic_summary,
-                    c.keywords = $keywords
-                """,
-                cluster_id=int(cluster_id),
-                topic_summary=topic_summary,
-                keywords=keywords,
-                clustering_algorithm=clustering_algorithm,
-            )
+            MATCH (c:Cluster)
+            CALL { WITH c REMOVE c.topic_summary, c.keywords } IN TRANSACTIONS OF $chunk_size ROWS
+            """,
+        ]
+        for query in cleanup_queries:
+            result = await session.run(query, {"chunk_size": chunk_size})
+            await result.consume()
+        logging.info("Existing Keyword and Topic nodes and Cluster topic properties deleted.")
+
+    # Keyword nodes use the normalized name, as in integrate_keyword_to_neo4j.py
+    article_rows = [
+        {
+            "uid": article_id,
+            "keywords": keywords,
+            "keyword_names": list(dict.fromkeys(map(normalize_keyword, keywords))),
+        }
+        for article_id, keywords in article_keywords.items()
+    ]
+    keyword_rows = [
+        {"name": name} for name in dict.fromkeys(name for row in article_rows for name in row["keyword_names"])
+    ]
+
+    # Articles share Keyword nodes, so merging them or linking articles to them in concurrent transactions
+    # would make those transactions wait on each other's locks and deadlock. The keywords are merged first
+    # and the articles are linked to them afterwards, both one chunk at a time.
+    keyword_query = """
+    UNWIND $rows AS row
+    MERGE (:Keyword {name: row.name})
+    """
+    article_query = """
+    UNWIND $rows AS row
+    MATCH (a:Article {uid: row.uid})
+    SET a.keywords = row.keywords
+    WITH a, row
+    UNWIND row.keyword_names AS keyword
+    MATCH (k:Keyword {name: keyword})
+    MERGE (a)-[:HAS_KEYWORD]->(k)
+    """
 
-        logging.info("Cluster topics are updated in Neo4j.")
+    async def update_article_keywords() -> None:
+        await awrite_in_chunks(driver, keyword_query, keyword_rows, chunk_size, max_concurrency=1, database=database)
+        await awrite_in_chunks(driver, article_query, article_rows, chunk_size, max_concurrency=1, database=database)
 
+    # Set topic summary and keywords in Cluster node using the algorithm
+    cluster_query = """
+    UNWIND $rows AS row
+    MATCH (c:Cluster {cluster_id: row.cluster_id, algorithm: $clustering_algorithm})
+    SET c.topic_summary = row.topic_summary,
+        c.keywords = row.keywords
+    """
+    cluster_rows = (
+        {"cluster_id": int(cluster_id), "topic_summary": data["topic_summary"], "keywords": data["keywords"]}
+        for cluster_id, data in cluster_results.items()
+    )
+
+    # Every cluster is its own node, so cluster chunks are written concurrently, next to the keyword updates
+    await asyncio.gather(
+        update_article_keywords(),
+        awrite_in_chunks(
+            driver,
+            cluster_query,
+            cluster_rows,
+            chunk_size,
+            {"clustering_algorithm": clustering_algorithm},
+            max_concurrency=max_concurrency,
+            database=database,
+        ),
+    )
+    logging.info("Article keywords and cluster topics are updated in Neo4j.")
 
-def main():
+
+async def main():
     """Process keywords and extract topics."""
-    with open(args.article_keywords, "r") as f:
-        article_keywords = json.load(f)
+    args = parse_arguments()
+
+    if OPENAI_API_KEY is None:
+        raise ValueError("OPENAI_API_KEY must be set in the environment.")
 
-    with open(args.clusters, "r") as f:
-        cluster_data = json.load(f)
+    # Cache topic summaries on disk, keyed by the rendered prompt and model parameters
+    set_llm_cache(SQLiteCache(database_path=LLM_CACHE_PATH))
+
+    if args.article_keywords.endswith(".jsonl"):
+        article_keywords = {}
+        # Read the whole file at once rather than through the buffered line iterator
+        for line in Path(args.article_keywords).read_bytes().splitlines():
+            if line.strip():
+                article_keywords.update(orjson.loads(line))
+    else:
+        article_keywords = orjson.loads(Path(args.article_keywords).read_bytes())
+
+    cluster_data = orjson.loads(Path(args.clusters).read_bytes())
 
     clusters, clustering_algorithm = (
         cluster_data["clusters"],
@@ -306,28 +399,45 @@ def main():
     else:
         logging.info("Skipping merge process as requested or no merge suggestions file" " provided.")
 
-    # check if cluster_results exists
-    if os.path.exists("data/cluster_results.json") and not args.force_run:
-        logging.info("Loading existing cluster results...")
-        with open("data/cluster_results.json", "r") as f:
-            cluster_results = json.load(f)
+    # Reuse the cluster results of previous runs unless a rerun is forced
+    if args.force_run:
+        cluster_results = {}
     else:
-        cluster_results = extract_topics(clusters, article_keywords)
+        cluster_results = load_cluster_results(CLUSTER_RESULTS_PATH)
+        logging.info(f"Loaded {len(cluster_results)} existing cluster results")
+
+    pending_clusters = {
+        cluster_id: article_uids
+        for cluster_id, article_uids in clusters.items()
+        if str(cluster_id) not in cluster_results
+    }
+    if pending_clusters:
+        # Each summary is appended as soon as it is ready, so an interrupted run can resume
+        with open(CLUSTER_RESULTS_PATH, "wb" if args.force_run else "ab") as f:
+            async for cluster_id, result in extract_topics(pending_clusters, article_keywords):
+                f.write(orjson.dumps({"cluster_id": cluster_id, **result}, option=orjson.OPT_APPEND_NEWLINE))
+                f.flush()
+                cluster_results[str(cluster_id)] = result
+        logging.info(f"Cluster results saved to {CLUSTER_RESULTS_PATH}")
 
     logging.info("Updating Neo4j database...")
-    update_neo4j(article_keywords, cluster_results, clusters, clustering_algorithm)
+    # One driver for the whole run; its pool is shared by the concurrent chunk writers.
+    async with AsyncGraphDatabase.driver(
+        args.neo4j_uri,
+        auth=(args.neo4j_user, args.neo4j_password),
+        max_connection_pool_size=64,
+        connection_acquisition_timeout=60,
+        fetch_size=10_000,
+    ) as driver:
+        await update_neo4j(
+            driver, article_keywords, cluster_results, clusters, clustering_algorithm, database=args.neo4j_database
+        )
 
     # Save updated article keywords
     logging.info("Saving updated article keywords...")
-    with open("data/updated_article_keywords.json", "w") as f:
-        json.dump(article_keywords, f, indent=4)
+    Path("data/updated_article_keywords.json").write_bytes(orjson.dumps(article_keywords, option=orjson.OPT_INDENT_2))
     logging.info("Updated article keywords saved to data/updated_article_keywords.json")
 
-    # Save cluster results
-    with open("data/cluster_results.json", "w") as f:
-        json.dump(cluster_results, f, indent=4)
-    logging.info("Cluster results saved to data/cluster_results.json")
-
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -3,24 +3,89 @@
 import hashlib
 import logging
 import os
+import random
 import re
 import string
 import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime
+from functools import lru_cache
 from typing import Any
-from xml.etree import ElementTree as ET
 
 import httpx
 import pandas as pd
 from httpx import HTTPError, HTTPStatusError, RequestError, Response
+from lxml import etree as ET
 
 logger = logging.getLogger(__name__)
 
 
+# Shared client so that repeated requests reuse pooled keep-alive connections. HTTP/2 multiplexes
+# requests to the same host over one connection. The pool limits and HTTP/2 are set on the
+# transport, as the client ignores them when it is given an explicit transport. httpx asks for
+# gzip compressed bodies by default and decompresses them, so ``response.content`` is plain XML.
+CLIENT = httpx.Client(
+    timeout=30,
+    transport=httpx.HTTPTransport(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+        retries=3,
+    ),
+)
+
+
+def get_retry_after(response: Response) -> float | None:
+    """
+    Get the number of seconds to wait from the ``Retry-After`` header of a response.
+
+    Parameters
+    ----------
+    response : Response
+        The HTTP response received from the server.
+
+    Returns
+    -------
+    float | None
+        The waiting period in seconds, or None if the header is missing or not a number of seconds.
+    """
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is None:
+        return None
+    try:
+        return max(float(retry_after), 0.0)
+    except ValueError:
+        return None
+
+
+def is_retryable(error: HTTPError) -> bool:
+    """
+    Check whether a failed request is worth retrying.
+
+    Parameters
+    ----------
+    error : HTTPError
+        The error raised for the request.
+
+    Returns
+    -------
+    bool
+        False for client errors other than 429 (Too Many Requests), True otherwise.
+    """
+    if isinstance(error, HTTPStatusError):
+        status_code = error.response.status_code
+        return status_code == 429 or status_code >= 500
+    return True
+
+
 def get_with_waiting(endpoint: str, retry_times: int = 5, wait: float = 30) -> Response:
     """
     Attempt to send a GET request to the specified endpoint.
 
+    Failed attempts are retried with exponential backoff and jitter, unless the server
+    specifies how long to wait through the ``Retry-After`` header. Client errors other
+    than 429 are raised straight away, as retrying them would give the same result.
+
     Parameters
     ----------
     endpoint : str
@@ -28,7 +93,7 @@ def get_with_waiting(endpoint: str, retry_times: int = 5, wait: float = 30) -> R
     retry_times : int | None
         The number of times to retry the request in case of failure.
     wait : float | None
-        The waiting period (in seconds) between retries (default is 30).
+        The base waiting period (in seconds) between retries (default is 30).
 
     Returns
     -------
@@ -39,23 +104,32 @@ def get_with_waiting(endpoint: str, retry_times: int = 5, wait: float = 30) -> R
     ------
     RequestError
         If all retry attempts fail, the last caught RequestError is raised.
+    HTTPStatusError
+        If the server answers with a client error, or all retry attempts fail.
     """
     for i in range(retry_times):
         try:
-            response = httpx.get(endpoint)
+            response = CLIENT.get(endpoint)
             response.raise_for_status()
             return response
         except (RequestError, HTTPError, HTTPStatusError) as e:
             # If we get an exception due to too many calls, wait and try again
-            if i == retry_times - 1:
+            if i == retry_times - 1 or not is_retryable(e):
                 raise e
-            time.sleep(wait)
+            retry_after = get_retry_after(e.response) if isinstance(e, HTTPStatusError) else None
+            if retry_after is None:
+                retry_after = wait * (2**i) * (0.5 + random.random())
+            time.sleep(retry_after)
     raise Exception("Maximum retries reached")
 
 
+@lru_cache(maxsize=65536)
 def generate_unique_id(name: str) -> str:
     r"""Generate a semi-unique id based on a (institution) name.
 
+    The id is stored as a node key, so the hash must stay stable across versions.
+    Results are cached because the same names come up many times in a run.
+
     \f
     Parameters
     ----------
@@ -67,15 +141,21 @@ def generate_unique_id(name: str) -> str:
     str
         Generated sha256 id.
     """
-    org_name_bytes = name.encode("utf-8")
-    hash_object = hashlib.sha256(org_name_bytes)
-    hash_hex = hash_object.hexdigest()
-    return hash_hex[:8]
+    return hashlib.sha256(name.encode("utf-8")).hexdigest()[:8]
+
 
+# Lowercase ASCII letters and delete every other ASCII byte in a single bytes.translate pass
+TITLE_TRANSLATION_TABLE = bytes.maketrans(string.ascii_uppercase.encode(), string.ascii_lowercase.encode())
+TITLE_DELETED_BYTES = bytes(byte for byte in range(128) if chr(byte) not in string.ascii_letters)
 
+
+@lru_cache(maxsize=65536)
 def normalize_title(text: str) -> str:
     r"""Normalize a title string.
 
+    Results are cached because the same titles are compared many times, e.g. across the
+    work lists of the ORCID records of co-authors.
+
     \f
     Parameters
     ----------
@@ -87,23 +167,36 @@ def normalize_title(text: str) -> str:
     str
         Normalized title string, truncated to a maximum of 30 characters.
     """
-    # Replace non-alphabetic and non-space characters with nothing
-    text = re.sub(r"[^a-zA-Z\s]", "", text)
-    # Replace multiple spaces with nothing
-    text = re.sub(r"\s+", "", text)
-    # Convert to lowercase
-    text = text.lower()
-    # Strip leading and trailing whitespace and punctuation
-    text = text.strip(string.punctuation + string.whitespace)
-    return text[:30].strip(string.punctuation + string.whitespace)
+    # Keep only ASCII letters, lowercased: non-ASCII characters are dropped by the encoding,
+    # everything else (digits, punctuation, whitespace) by the translation.
+    normalized = text.encode("ascii", "ignore").translate(TITLE_TRANSLATION_TABLE, TITLE_DELETED_BYTES)
+    return normalized[:30].decode("ascii")
 
 
-def is_valid_doi(doi_str):
-    """Check if str is a valid DOI."""
-    return bool(DOI_PATTERN.match(doi_str))
+def normalize_keyword(keyword: str) -> str:
+    r"""Normalize a keyword so that trivially different spellings compare equal.
 
+    \f
+    Parameters
+    ----------
+    keyword : str
+        Keyword as returned by the keyword extraction.
 
-DOI_PATTERN = re.compile(r"^10\.\d{4,9}/[-._;()/:A-Z0-9]+$", re.IGNORECASE)
+    Returns
+    -------
+    str
+        NFKC-normalized, lowercased keyword with whitespace runs collapsed to single spaces.
+    """
+    return " ".join(unicodedata.normalize("NFKC", keyword).lower().split())
+
+
+# Explicit ASCII classes with fullmatch avoid the slower case-insensitive matching
+DOI_PATTERN = re.compile(r"10\.[0-9]{4,9}/[-._;()/:A-Za-z0-9]+")
+
+
+def is_valid_doi(doi_str):
+    """Check if str is a valid DOI."""
+    return DOI_PATTERN.fullmatch(doi_str) is not None
 
 
 def to_date(date_str: str | Any) -> date | None:
@@ -131,40 +224,78 @@ def to_date(date_str: str | Any) -> date | None:
             return None
         if len(date_str) == 4 and date_str.isdigit():
             return datetime(int(date_str), 1, 1)
-        else:
-            return pd.to_datetime(date_str).date()
+        if isinstance(date_str, str) and (len(date_str) == 10 or date_str[10:11] in ("T", " ")):
+            # Most dates are ISO formatted, which the stdlib parses much faster than pandas. Anything
+            # after the date must be a time, other suffixes are left for pandas to reject.
+            try:
+                return date.fromisoformat(date_str[:10])
+            except ValueError:
+                pass
+        return pd.to_datetime(date_str).date()
     except Exception as e:
         raise ValueError(f"Invalid date format: {date_str}") from e
 
 
-def load_europmc_xmls(europmc_article_xmls_path: str):
+def xpath_text(xpath: ET.XPath, element: ET._Element) -> str | None:
+    """
+    Return the first text node selected by a compiled XPath expression.
+
+    Parameters
+    ----------
+    xpath : ET.XPath
+        Compiled XPath expression ending in ``text()``.
+    element : ET._Element
+        The element the expression is evaluated on.
+
+    Returns
+    -------
+    str | None
+        The first selected text, or None if nothing was selected.
+    """
+    texts = xpath(element)
+    return texts[0] if texts else None
+
+
+def load_europmc_xmls(europmc_article_xmls_path: str, max_workers: int = 8):
     """
     Load EuroPMC xml files.
 
+    Files are read and parsed by a thread pool so that reads from slow (e.g. network)
+    filesystems overlap. Parsed trees stay in this process, avoiding the cost of pickling
+    them back from worker processes, which is higher than parsing itself.
+
     Parameters
     ----------
     europmc_article_xmls_path : str
         The path to the directory containing Europe PMC XML files.
+    max_workers : int
+        The number of threads reading and parsing files.
 
     Returns
     -------
     xml_map : dict
     """
-    xml_map = {}
-    for filename in os.listdir(europmc_article_xmls_path):
-        if filename.endswith(".xml"):
-            file_path = os.path.join(europmc_article_xmls_path, filename)
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-            file_key = os.path.splitext(filename)[0]
-            xml_map[file_key] = root
-    return xml_map
-
-
-def save_xml_map(xml_map: dict, directory: str):
+    file_keys = []
+    file_paths = []
+    with os.scandir(europmc_article_xmls_path) as entries:
+        for entry in entries:
+            # DirEntry.is_file uses the file type from the directory listing, without a stat
+            if entry.name.endswith(".xml") and entry.is_file():
+                file_keys.append(os.path.splitext(entry.name)[0])
+                file_paths.append(entry.path)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        roots = executor.map(lambda file_path: ET.parse(file_path).getroot(), file_paths)
+        return dict(zip(file_keys, roots))
+
+
+def save_xml_map(xml_map: dict, directory: str, max_workers: int = 8):
     """
     Save xmls fetched from EuroPMC.
 
+    Files that already exist are not overwritten; a numeric suffix is added instead.
+    Unique filenames are resolved up front from a single directory listing and the
+    files are then written by a thread pool.
+
     Parameters
     ----------
     xml_map : dict
@@ -173,18 +304,24 @@ def save_xml_map(xml_map: dict, directory: str):
     directory : str
         The directory where the XML files will be saved.
 
+    max_workers : int
+        The number of threads writing files.
+
     """
-    for key, root in xml_map.items():
+    existing = set(os.listdir(directory))
+    file_paths = []
+    for key in xml_map:
         filename = f"{key}.xml"
-        file_path = os.path.join(directory, filename)
-
-        if os.path.exists(file_path):
-            base, ext = os.path.splitext(filename)
-            counter = 1
-            while os.path.exists(file_path):
-                new_filename = f"{base}_{counter}{ext}"
-                file_path = os.path.join(directory, new_filename)
-                counter += 1
-
-        tree = ET.ElementTree(root)
-        tree.write(file_path, encoding="utf-8", xml_declaration=True)
+        counter = 1
+        while filename in existing:
+            filename = f"{key}_{counter}.xml"
+            counter += 1
+        existing.add(filename)
+        file_paths.append(os.path.join(directory, filename))
+
+    def write_xml(file_path: str, root: ET._Element):
+        ET.ElementTree(root).write(file_path, encoding="utf-8", xml_declaration=True)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Consume the results so that write errors are raised
+        list(executor.map(write_xml, file_paths, xml_map.values()))
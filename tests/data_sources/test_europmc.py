@@ -1,27 +1,51 @@
-import xml.etree.ElementTree as ET
 from unittest.mock import Mock, patch
 
 import httpx
 import pytest
 from httpx import HTTPStatusError
+from lxml import etree as ET
 
 from citations.data_sources.europmc import (
+    clear_caches,
     extract_authors,
     extract_bbp_article,
     fetch_article_element,
     fetch_citation_ids,
     get_article,
     get_citations,
+    parse_citation_page,
 )
 from citations.schemas import Article
 from citations.utils import to_date
 
 
+@pytest.fixture(autouse=True)
+def clear_europmc_caches():
+    # Every test mocks its own responses for the same ids
+    clear_caches()
+    yield
+    clear_caches()
+
+
+# Citation pages only hold plain ids, so they are filled in as text rather than built
+# element by element
+CITATION_RESPONSE_TEMPLATE = (
+    '<responseWrapper xmlns:slx="http://www.scholix.org"'
+    ' xmlns:epmc="https://www.europepmc.org/data">'
+    "<hitCount>{hit_count}</hitCount>"
+    "<citationList>{citations}</citationList>"
+    "</responseWrapper>"
+)
+CITATION_TEMPLATE = (
+    "<citation><id>{article_id}</id><source>{source}</source></citation>"
+)
+
+
 def generate_citation_response_xml(
     article_ids: list[str], source: str, hit_count: int
-) -> str:
+) -> bytes:
     """
-    Generate an XML string for a given list of IDs.
+    Generate an XML document for a given list of IDs.
 
     Parameters
     ----------
@@ -34,24 +58,16 @@ def generate_citation_response_xml(
 
     Returns
     -------
-    str
-        The generated XML as a string.
+    bytes
+        The generated XML as bytes.
     """
-    response_wrapper = ET.Element(
-        "responseWrapper",
-        {
-            "xmlns:slx": "http://www.scholix.org",
-            "xmlns:epmc": "https://www.europepmc.org/data",
-        },
+    citations = "".join(
+        CITATION_TEMPLATE.format(article_id=article_id, source=source)
+        for article_id in article_ids
     )
-    ET.SubElement(response_wrapper, "hitCount").text = str(hit_count)
-    citation_list = ET.SubElement(response_wrapper, "citationList")
-    for article_id in article_ids:
-        citation = ET.SubElement(citation_list, "citation")
-        ET.SubElement(citation, "id").text = article_id
-        ET.SubElement(citation, "source").text = source
-
-    return ET.tostring(response_wrapper, encoding="unicode")
+    return CITATION_RESPONSE_TEMPLATE.format(
+        hit_count=hit_count, citations=citations
+    ).encode()
 
 
 def generate_single_result_xml(
@@ -68,9 +84,9 @@ def generate_single_result_xml(
     if result_list is None:
         result = ET.Element(
             "result",
-            {
-                "xmlns:slx": "http://www.scholix.org",
-                "xmlns:epmc": "https://www.europepmc.org/data",
+            nsmap={
+                "slx": "http://www.scholix.org",
+                "epmc": "https://www.europepmc.org/data",
             },
         )
     else:
@@ -96,9 +112,9 @@ def generate_article_search_results_xml(
 ):
     response_wrapper = ET.Element(
         "responseWrapper",
-        {
-            "xmlns:slx": "http://www.scholix.org",
-            "xmlns:epmc": "https://www.europepmc.org/data",
+        nsmap={
+            "slx": "http://www.scholix.org",
+            "epmc": "https://www.europepmc.org/data",
         },
     )
 
@@ -114,25 +130,27 @@ def generate_article_search_results_xml(
             result_list=result_list,
         )
 
-    return ET.tostring(response_wrapper, encoding="unicode")
+    return ET.tostring(response_wrapper)
+
+
+@pytest.fixture(scope="module")
+def empty_search_results_xml():
+    # Responses only read the bytes, so one payload is shared by the whole module
+    return generate_article_search_results_xml([], [], [], [], [], [])
 
 
 def test_fetch_citation_ids():
-    response1 = httpx.Response(
-        status_code=200,
-        text=generate_citation_response_xml(["1", "2"], "MED", 6),
-    )
-    response2 = httpx.Response(
-        status_code=200,
-        text=generate_citation_response_xml(["3", "4"], "MED", 6),
-    )
-    response3 = httpx.Response(
-        status_code=200,
-        text=generate_citation_response_xml(["5", "6"], "MED", 6),
+    # Each page is only built when it is requested
+    responses = (
+        httpx.Response(
+            status_code=200,
+            content=generate_citation_response_xml(article_ids, "MED", 6),
+        )
+        for article_ids in (["1", "2"], ["3", "4"], ["5", "6"])
     )
     with patch(
         "citations.data_sources.europmc.get_with_waiting",
-        side_effect=[response1, response2, response3],
+        side_effect=responses,
     ):
         citation_ids = fetch_citation_ids(
             "example_id", "example_source", page_size=2
@@ -144,7 +162,7 @@ def test_fetch_citation_ids():
 def test_fetch_citation_ids_self_citation():
     response1 = httpx.Response(
         status_code=200,
-        text=generate_citation_response_xml(["1", "2"], "MED", 2),
+        content=generate_citation_response_xml(["1", "2"], "MED", 2),
     )
     with patch(
         "citations.data_sources.europmc.get_with_waiting",
@@ -155,6 +173,12 @@ def test_fetch_citation_ids_self_citation():
     assert citation_ids == ["2"]
 
 
+def test_parse_citation_page():
+    content = generate_citation_response_xml(["1", "2", "3"], "MED", 7)
+    assert parse_citation_page(content) == (7, ["1", "2", "3"])
+    assert parse_citation_page(b"<responseWrapper>") is None
+
+
 def test_fetch_citation_ids_invalid_id():
     response = httpx.Response(
         status_code=200,
@@ -217,7 +241,7 @@ def test_fetch_article_element_doi():
     isbn = "isbn1"
     response = httpx.Response(
         status_code=200,
-        text=generate_article_search_results_xml(
+        content=generate_article_search_results_xml(
             [article_id], [source], [pmid], [doi1], [title], [isbn]
         ),
     )
@@ -232,30 +256,30 @@ def test_fetch_article_element_doi():
         assert article_element.find("./title").text == title
 
 
-def test_fetch_article_element_isbns():
+def test_fetch_article_element_isbns(empty_search_results_xml):
     article_id = "article1"
     source = "MED"
     pmid = "pmid1"
     doi1 = "doi1"
     title = "title1"
     isbn = "isbn2"
-    response1 = httpx.Response(
-        status_code=200,
-        text=generate_article_search_results_xml([], [], [], [], [], []),
-    )
-    response2 = httpx.Response(
-        status_code=200,
-        text=generate_article_search_results_xml([], [], [], [], [], []),
-    )
-    response3 = httpx.Response(
-        status_code=200,
-        text=generate_article_search_results_xml(
-            [article_id], [source], [pmid], [doi1], [title], [isbn]
-        ),
-    )
+
+    def responses():
+        # Each response is only built when it is requested
+        for _ in range(2):
+            yield httpx.Response(
+                status_code=200, content=empty_search_results_xml
+            )
+        yield httpx.Response(
+            status_code=200,
+            content=generate_article_search_results_xml(
+                [article_id], [source], [pmid], [doi1], [title], [isbn]
+            ),
+        )
+
     with patch(
         "citations.data_sources.europmc.get_with_waiting",
-        side_effect=[response1, response2, response3],
+        side_effect=responses(),
     ):
         article_element = fetch_article_element(
             "bad doi", "isbn1 isbn2", title
@@ -276,7 +300,7 @@ def test_fetch_article_element_title():
     isbn = "isbn1"
     response = httpx.Response(
         status_code=200,
-        text=generate_article_search_results_xml(
+        content=generate_article_search_results_xml(
             [article_id], [source], [pmid], [doi1], [title], [isbn]
         ),
     )
@@ -291,10 +315,9 @@ def test_fetch_article_element_title():
         assert article_element.find("./title").text == title
 
 
-def test_fetch_article_element_not_found():
+def test_fetch_article_element_not_found(empty_search_results_xml):
     response = httpx.Response(
-        status_code=200,
-        text=generate_article_search_results_xml([], [], [], [], [], []),
+        status_code=200, content=empty_search_results_xml
     )
     with patch(
         "citations.data_sources.europmc.get_with_waiting",
@@ -333,14 +356,11 @@ def generate_get_article_response_xml(
     pmid: str | None = None,
     europmc_id: str | None = None,
     date: str | None = None,
-) -> str:
-    response_wrapper = ET.Element(
-        "responseWrapper",
-        {},
-    )
+) -> bytes:
+    response_wrapper = ET.Element("responseWrapper")
     result = ET.SubElement(response_wrapper, "resultList")
     if doi is None:
-        return ET.tostring(response_wrapper, encoding="unicode")
+        return ET.tostring(response_wrapper)
     result = ET.SubElement(result, "result")
     ET.SubElement(result, "doi").text = doi
     ET.SubElement(result, "title").text = title
@@ -354,7 +374,7 @@ def generate_get_article_response_xml(
     ET.SubElement(result, "id").text = europmc_id
     ET.SubElement(result, "firstPublicationDate").text = date
 
-    return ET.tostring(response_wrapper, encoding="unicode")
+    return ET.tostring(response_wrapper)
 
 
 @pytest.mark.parametrize(
@@ -383,7 +403,7 @@ def generate_get_article_response_xml(
 def test_get_article(doi, title, abstract, urls, pmid, europmc_id, date):
     response = httpx.Response(
         status_code=200,
-        text=generate_get_article_response_xml(
+        content=generate_get_article_response_xml(
             doi, title, abstract, urls, pmid, europmc_id, date
         ),
     )
@@ -407,7 +427,7 @@ def test_get_article(doi, title, abstract, urls, pmid, europmc_id, date):
 
 def test_get_article_no_article():
     response = httpx.Response(
-        status_code=200, text=generate_get_article_response_xml()
+        status_code=200, content=generate_get_article_response_xml()
     )
     with patch(
         "citations.data_sources.europmc.get_with_waiting",
@@ -449,8 +469,11 @@ def test_get_citations(citation_ids, articles):
         "citations.data_sources.europmc.fetch_citation_ids",
         return_value=citation_ids,
     ):
+        # Articles are fetched concurrently, so look them up by id
+        articles_by_uid = {article.uid: article for article in articles or []}
         with patch(
-            "citations.data_sources.europmc.get_article", side_effect=articles
+            "citations.data_sources.europmc.get_article",
+            side_effect=lambda uid, europmc_xml_map: articles_by_uid[uid],
         ):
             citations, citing_articles = get_citations("uid3", "MED")
 
@@ -479,3 +502,57 @@ def test_extract_authors():
         author_list=orcid_ids,
     )
     assert extract_authors(result) == orcid_ids
+
+
+def test_get_article_is_cached():
+    response = httpx.Response(
+        status_code=200,
+        content=generate_get_article_response_xml(
+            "doi1",
+            "Great title",
+            "Great abstract",
+            [],
+            "1",
+            "id1",
+            "2020-01-01",
+        ),
+    )
+    with patch(
+        "citations.data_sources.europmc.get_with_waiting",
+        return_value=response,
+    ) as get_with_waiting:
+        europmc_xml_map = {}
+        article = get_article("id1", europmc_xml_map)
+        assert get_article("id1", europmc_xml_map) == article
+        assert get_article("id1") == article
+        assert get_with_waiting.call_count == 1
+        assert "id1" in europmc_xml_map
+        # Another map gets its own tree rather than the one already stored
+        other_xml_map = {}
+        assert get_article("id1", other_xml_map) == article
+        assert get_with_waiting.call_count == 2
+        assert other_xml_map["id1"] is not europmc_xml_map["id1"]
+
+
+def test_get_article_failure_is_not_cached():
+    responses = (
+        httpx.Response(status_code=200, content=content)
+        for content in (
+            b"<responseWrapper>",
+            generate_get_article_response_xml(
+                "doi1",
+                "Great title",
+                "Great abstract",
+                [],
+                "1",
+                "id1",
+                "2020-01-01",
+            ),
+        )
+    )
+    with patch(
+        "citations.data_sources.europmc.get_with_waiting",
+        side_effect=responses,
+    ):
+        assert get_article("id1") is None
+        assert get_article("id1").uid == "id1"
@@ -1,9 +1,10 @@
-import xml.etree.ElementTree as ET
 from datetime import date
 from unittest.mock import patch
 
 import httpx
 import pytest
+from lxml import etree as ET
+from lxml.builder import ElementMaker
 
 from citations.data_sources.orcid import (
     NAMESPACES,
@@ -14,32 +15,35 @@ from citations.data_sources.orcid import (
 )
 
 
+def qname(prefix: str, tag: str) -> str:
+    return f"{{{NAMESPACES[prefix]}}}{tag}"
+
+
 def generate_affiliation_xml(
     organization, start_date, end_date, pos_type="education"
 ):
-    xml_string = f"""
-    <{pos_type}:{pos_type}-summary xmlns:{pos_type}="http://www.orcid.org/ns/{pos_type}"
-        xmlns:common="http://www.orcid.org/ns/common">
-        <common:start-date>
-            <common:year>{str(start_date.year)}</common:year>
-            <common:month>{str(start_date.month)}</common:month>
-            <common:day>{str(start_date.day)}</common:day>
-        </common:start-date>
-        <common:end-date>
-            <common:year>{str(end_date.year)}</common:year>
-            <common:month>{str(end_date.month)}</common:month>
-            <common:day>{str(end_date.day)}</common:day>
-        </common:end-date>
-        <common:organization>
-            <common:name>{organization}</common:name>
-            <common:address>
-                <common:city>Ås</common:city>
-                <common:country>NO</common:country>
-            </common:address>
-        </common:organization>
-    </{pos_type}:{pos_type}-summary>
-    """
-    return ET.fromstring(xml_string)
+    E = ElementMaker(
+        namespace=NAMESPACES["common"],
+        nsmap={pos_type: NAMESPACES[pos_type], "common": NAMESPACES["common"]},
+    )
+
+    def date_element(date_type, value):
+        return E(
+            date_type,
+            E.year(str(value.year)),
+            E.month(str(value.month)),
+            E.day(str(value.day)),
+        )
+
+    return E(
+        qname(pos_type, f"{pos_type}-summary"),
+        date_element("start-date", start_date),
+        date_element("end-date", end_date),
+        E.organization(
+            E.name(organization),
+            E.address(E.city("Ås"), E.country("NO")),
+        ),
+    )
 
 
 @pytest.mark.parametrize(
@@ -79,59 +83,68 @@ def test_extract_affiliation_date(date_type):
 
 def generate_orcid_list(orcid_ids: list[str]):
     response_wrapper = ET.Element(
-        "search:search",
-        {
-            "xmlns:search": NAMESPACES["search"],
-            "xmlns:common": NAMESPACES["common"],
+        qname("search", "search"),
+        nsmap={
+            "search": NAMESPACES["search"],
+            "common": NAMESPACES["common"],
         },
     )
     for orcidid in orcid_ids:
-        result = ET.SubElement(response_wrapper, "search:result")
-        orcid_identifier = ET.SubElement(result, "common:orcid-identifier")
-        ET.SubElement(orcid_identifier, "common:path").text = orcidid
-    return ET.tostring(response_wrapper, encoding="unicode")
+        result = ET.SubElement(response_wrapper, qname("search", "result"))
+        orcid_identifier = ET.SubElement(
+            result, qname("common", "orcid-identifier")
+        )
+        ET.SubElement(orcid_identifier, qname("common", "path")).text = orcidid
+    return ET.tostring(response_wrapper)
 
 
 def generate_author_record(
     titles: list[str], article_organizations=None, element=False
 ):
     response_wrapper = ET.Element(
-        "record:record",
-        {
-            "xmlns:record": NAMESPACES["record"],
-            "xmlns:activities": NAMESPACES["activities"],
-            "xmlns:work": NAMESPACES["work"],
-            "xmlns:common": NAMESPACES["common"],
+        qname("record", "record"),
+        nsmap={
+            "record": NAMESPACES["record"],
+            "activities": NAMESPACES["activities"],
+            "work": NAMESPACES["work"],
+            "common": NAMESPACES["common"],
         },
     )
     activities = ET.SubElement(
-        response_wrapper, "activities:activities-summary"
+        response_wrapper, qname("activities", "activities-summary")
     )
-    works = ET.SubElement(activities, "activities:works")
-    group = ET.SubElement(works, "activities:group")
+    works = ET.SubElement(activities, qname("activities", "works"))
+    group = ET.SubElement(works, qname("activities", "group"))
     for i, title in enumerate(titles):
-        work_summary = ET.SubElement(group, "work:work-summary")
-        work_title = ET.SubElement(work_summary, "work:title")
-        ET.SubElement(work_title, "common:title").text = title
+        work_summary = ET.SubElement(group, qname("work", "work-summary"))
+        work_title = ET.SubElement(work_summary, qname("work", "title"))
+        ET.SubElement(work_title, qname("common", "title")).text = title
         if article_organizations is not None:
             org = article_organizations[i]
             org_name = org["name"]
             org_id = org["id"]
             org_source = org["source"]
-            organization = ET.SubElement(work_summary, "common:organization")
-            ET.SubElement(organization, "common:name").text = org_name
-            dis_org = ET.SubElement(organization, "disambiguated-organization")
+            organization = ET.SubElement(
+                work_summary, qname("common", "organization")
+            )
+            ET.SubElement(organization, qname("common", "name")).text = (
+                org_name
+            )
+            dis_org = ET.SubElement(
+                organization, qname("common", "disambiguated-organization")
+            )
             ET.SubElement(
-                dis_org, "common:disambiguated-organization"
+                dis_org,
+                qname("common", "disambiguated-organization-identifier"),
             ).text = org_id
             ET.SubElement(
-                dis_org, "common:disambiguated-organization-identifier"
+                dis_org, qname("common", "disambiguation-source")
             ).text = org_source
 
     if element:
         return response_wrapper
     else:
-        return ET.tostring(response_wrapper, encoding="unicode")
+        return ET.tostring(response_wrapper)
 
 
 def test_filter_orcidids():
@@ -139,21 +152,25 @@ def test_filter_orcidids():
     article_title = "In Silico Brain Imaging"
     bad_orcid_id = "orcid1"
     good_orcid_id = "orcid2"
-    response1 = httpx.Response(
-        status_code=200,
-        text=generate_author_record(
-            ["From Big Data to Big Displays", "A Physically Plausible Model"]
-        ),
-    )
-    response2 = httpx.Response(
-        status_code=200,
-        text=generate_author_record(
-            ["In Silico Brain Imaging", "Large Volume Imaging of Rodent Brain"]
-        ),
-    )
+    titles_by_orcid_id = {
+        bad_orcid_id: [
+            "From Big Data to Big Displays",
+            "A Physically Plausible Model",
+        ],
+        good_orcid_id: [
+            "In Silico Brain Imaging",
+            "Large Volume Imaging of Rodent Brain",
+        ],
+    }
+    # Records are fetched concurrently, so responses are matched on the url
     with patch(
         "citations.data_sources.orcid.get_with_waiting",
-        side_effect=[response1, response2],
+        side_effect=lambda url: httpx.Response(
+            status_code=200,
+            content=generate_author_record(
+                titles_by_orcid_id[url.split("/")[-2]]
+            ),
+        ),
     ):
         filtered_orcidids = filter_orcidids(orcid_ids, article_title)
         assert bad_orcid_id not in filtered_orcidids
@@ -163,7 +180,7 @@ def test_filter_orcidids():
 def test_fetch_article_authors_doi():
     orcid_ids = ["orcid1", "orcid2"]
     response = httpx.Response(
-        status_code=200, text=generate_orcid_list(orcid_ids)
+        status_code=200, content=generate_orcid_list(orcid_ids)
     )
     with patch(
         "citations.data_sources.orcid.get_with_waiting",
@@ -181,7 +198,7 @@ def test_fetch_article_authors_pmid():
     orcid_ids = ["orcid1", "orcid2"]
     response1 = httpx.Response(status_code=400, text="")
     response2 = httpx.Response(
-        status_code=200, text=generate_orcid_list(orcid_ids)
+        status_code=200, content=generate_orcid_list(orcid_ids)
     )
     with patch(
         "citations.data_sources.orcid.get_with_waiting",
@@ -210,6 +227,7 @@ def test_get_author_affiliation():
     from citations.data_sources.orcid import get_author_affiliations
 
     institutions, affiliations = get_author_affiliations(orcidid, record)
+    assert len(institutions) == len(expected_institutions)
     for i in range(len(institutions)):
         inst = institutions[i]
         aff = affiliations[i]
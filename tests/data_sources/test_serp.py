@@ -1,4 +1,4 @@
-import json
+import orjson
 
 from citations.data_sources import serp
 
@@ -33,7 +33,7 @@ def test_create_author_id_mapping_single_json_file_single_profile(tmp_path):
     # Create a dummy .json file in the temp directory
     dummy_json = tmp_path / "dummy.json"
     dummy_data = {"profiles": [{"author_id": "123"}]}
-    dummy_json.write_text(json.dumps(dummy_data))
+    dummy_json.write_bytes(orjson.dumps(dummy_data))
 
     # Call function with temp directory as argument
     result = serp.create_author_id_mapping(tmp_path)
@@ -51,7 +51,7 @@ def test_create_author_id_mapping_multiple_json_files_single_profile_each(
     for i in range(3):
         dummy_json = tmp_path / f"dummy{i}.json"
         dummy_data = {"profiles": [{"author_id": f"{i}"}]}
-        dummy_json.write_text(json.dumps(dummy_data))
+        dummy_json.write_bytes(orjson.dumps(dummy_data))
 
     # Call function with temp directory as argument
     result = serp.create_author_id_mapping(tmp_path)
@@ -66,7 +66,7 @@ def test_create_author_id_mapping_json_file_no_profile(tmp_path):
     # Create a dummy .json file in the temp directory with a missing "profiles" field
     dummy_json = tmp_path / "dummy.json"
     dummy_data = {}
-    dummy_json.write_text(json.dumps(dummy_data))
+    dummy_json.write_bytes(orjson.dumps(dummy_data))
 
     # Call function with temp directory as argument
     result = serp.create_author_id_mapping(tmp_path)
@@ -81,7 +81,7 @@ def test_create_author_id_mapping_json_file_multiple_profiles(tmp_path):
     # Create a dummy .json file in the temp directory with multiple "profiles" fields
     dummy_json = tmp_path / "dummy.json"
     dummy_data = {"profiles": [{"author_id": "123"}, {"author_id": "456"}]}
-    dummy_json.write_text(json.dumps(dummy_data))
+    dummy_json.write_bytes(orjson.dumps(dummy_data))
 
     # Call function with temp directory as argument
     result = serp.create_author_id_mapping(tmp_path)
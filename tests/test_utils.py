@@ -1,12 +1,20 @@
 """Test utility functions."""
 
+from datetime import date
+
 import pytest
-from httpx import RequestError
+from httpx import HTTPStatusError, RequestError
+from lxml import etree as ET
 
 from citations.utils import (
+    CLIENT,
     generate_unique_id,
     get_with_waiting,
+    is_valid_doi,
+    normalize_keyword,
     normalize_title,
+    to_date,
+    xpath_text,
 )
 
 
@@ -27,6 +35,32 @@ def test_get_with_waiting_retry(httpx_mock):
     assert response.text == response_text
 
 
+def test_get_with_waiting_retry_after(httpx_mock, monkeypatch):
+    response_text = "Great response"
+    url = "https://dummy.com"
+    sleeps = []
+    monkeypatch.setattr("citations.utils.time.sleep", sleeps.append)
+    httpx_mock.add_response(
+        url=url, method="GET", status_code=429, headers={"Retry-After": "2"}
+    )
+    httpx_mock.add_response(url=url, method="GET", text=response_text)
+    response = get_with_waiting(url, wait=0.01)
+    assert response.text == response_text
+    assert sleeps == [2.0]
+
+
+def test_get_with_waiting_client_error_is_not_retried(httpx_mock):
+    url = "https://dummy.com"
+    httpx_mock.add_response(url=url, method="GET", status_code=404)
+    with pytest.raises(HTTPStatusError):
+        get_with_waiting(url, wait=0.01)
+    assert len(httpx_mock.get_requests()) == 1
+
+
+def test_client_requests_compressed_responses():
+    assert "gzip" in CLIENT.headers["Accept-Encoding"]
+
+
 def test_generate_unique_id_different_input():
     name1 = "Institution One"
     name2 = "Institution Two"
@@ -35,6 +69,10 @@ def test_generate_unique_id_different_input():
     assert id1 != id2
 
 
+def test_generate_unique_id_is_stable():
+    assert generate_unique_id("Institution One") == "cb5a86cd"
+
+
 @pytest.mark.parametrize(
     "input1, input2",
     [
@@ -60,3 +98,61 @@ def test_generate_unique_id_different_input():
 )
 def test_normalize_bbp_title(input1, input2):
     assert normalize_title(input1) == normalize_title(input2)
+
+
+@pytest.mark.parametrize(
+    "input1, input2",
+    [
+        ("Machine Learning", "machine learning"),
+        ("  spiking   neural networks ", "Spiking Neural Networks"),
+        ("ﬁbroblast", "fibroblast"),
+    ],
+)
+def test_normalize_keyword(input1, input2):
+    assert (
+        normalize_keyword(input1)
+        == normalize_keyword(input2)
+        == input2.lower()
+    )
+
+
+@pytest.mark.parametrize(
+    "doi, expected",
+    [
+        ("10.1016/j.neuron.2015.09.029", True),
+        ("10.3389/FNINF.2018.00042", True),
+        ("10.123/abc", False),
+        ("11.1016/j.neuron.2015.09.029", False),
+        ("10.1016/j.neuron 2015", False),
+        ("10.1016/abc\n", False),
+    ],
+)
+def test_is_valid_doi(doi, expected):
+    assert is_valid_doi(doi) is expected
+
+
+@pytest.mark.parametrize(
+    "date_str, expected",
+    [
+        ("2020-01-01", date(2020, 1, 1)),
+        ("2020-01-01T10:30:00", date(2020, 1, 1)),
+        ("2020-01-01 10:30:00", date(2020, 1, 1)),
+    ],
+)
+def test_to_date(date_str, expected):
+    assert to_date(date_str) == expected
+
+
+@pytest.mark.parametrize("date_str", ["2020-01-01garbage", "2020-01-011"])
+def test_to_date_malformed_suffix(date_str):
+    with pytest.raises(ValueError):
+        to_date(date_str)
+
+
+def test_xpath_text():
+    element = ET.fromstring(
+        "<result><title>Great title</title><doi/></result>"
+    )
+    assert xpath_text(ET.XPath("./title/text()"), element) == "Great title"
+    assert xpath_text(ET.XPath("./doi/text()"), element) is None
+    assert xpath_text(ET.XPath("./pmid/text()"), element) is None